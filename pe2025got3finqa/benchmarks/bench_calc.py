@@ -0,0 +1,103 @@
+# bench_calc.py
+# Per-call latency of the calculation tools: separate math/fin stdio servers, the merged calc server
+# and the in-process tools. Run from the project root:
+#   python ./benchmarks/bench_calc.py --calls 500
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+from contextlib import AsyncExitStack
+from pathlib import Path
+
+from mcp import ClientSession, StdioServerParameters
+from mcp.client.stdio import stdio_client
+
+ROOT = Path(__file__).resolve().parent.parent
+os.chdir(ROOT)
+sys.path.insert(0, str(ROOT / "servers"))
+
+# (tool, arguments) alternating between a math and a fin tool, as in a level-3/4 calculation
+CALLS = [
+    ("subtract", {"a": 1410.5, "b": 1288.2}),
+    ("calculate_operating_profit_margin", {"operating_profit": 1410.5, "sales": 9012.0})
+]
+CONFIGS = {
+    'separate': {"subtract": "./servers/math_server.py", "calculate_operating_profit_margin": "./servers/fin_server.py"},
+    'server': {"subtract": "./servers/calc_server.py", "calculate_operating_profit_margin": "./servers/calc_server.py"}
+}
+
+
+def summarize(latencies, startup_s):
+    latencies = sorted(latencies)
+    return {
+        'calls': len(latencies),
+        'startup_s': round(startup_s, 3),
+        'mean_ms': round(statistics.mean(latencies), 3),
+        'p50_ms': round(statistics.median(latencies), 3),
+        'p95_ms': round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 3)
+    }
+
+
+async def open_session(stack, script):
+    read, write = await stack.enter_async_context(stdio_client(StdioServerParameters(command=sys.executable, args=[script])))
+    session = await stack.enter_async_context(ClientSession(read, write))
+    await session.initialize()
+    return session
+
+
+async def bench_stdio(routes, calls):
+    async with AsyncExitStack() as stack:
+        start = time.perf_counter()
+        sessions = {}
+        for script in dict.fromkeys(routes.values()):
+            sessions[script] = await open_session(stack, script)
+        startup_s = time.perf_counter() - start
+
+        latencies = []
+        for i in range(calls):
+            tool, arguments = CALLS[i % len(CALLS)]
+            call_start = time.perf_counter()
+            await sessions[routes[tool]].call_tool(tool, arguments)
+            latencies.append((time.perf_counter() - call_start) * 1000)
+        return summarize(latencies, startup_s)
+
+
+async def bench_inprocess(calls):
+    start = time.perf_counter()
+    import calc_server
+    tools = {tool.name: tool for tool in calc_server.langchain_tools()}
+    startup_s = time.perf_counter() - start
+
+    latencies = []
+    for i in range(calls):
+        tool, arguments = CALLS[i % len(CALLS)]
+        call_start = time.perf_counter()
+        await tools[tool].ainvoke(arguments)
+        latencies.append((time.perf_counter() - call_start) * 1000)
+    return summarize(latencies, startup_s)
+
+
+async def main(calls):
+    results = {name: await bench_stdio(routes, calls) for name, routes in CONFIGS.items()}
+    results['inprocess'] = await bench_inprocess(calls)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the calculation tools across deployment modes")
+    parser.add_argument("--calls", type=int, default=500)
+    parser.add_argument("--output", default="", help="optional JSON file for the results")
+    args = parser.parse_args()
+
+    results = asyncio.run(main(args.calls))
+    print(f"{'mode':<12}{'processes':>10}{'startup s':>11}{'calls':>7}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}")
+    for mode, row in results.items():
+        processes = len(set(CONFIGS[mode].values())) if mode in CONFIGS else 0
+        print(f"{mode:<12}{processes:>10}{row['startup_s']:>11.2f}{row['calls']:>7}{row['mean_ms']:>10.3f}"
+              f"{row['p50_ms']:>10.3f}{row['p95_ms']:>10.3f}")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=4)
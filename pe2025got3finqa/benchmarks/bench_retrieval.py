@@ -0,0 +1,122 @@
+# bench_retrieval.py
+# Offline benchmark of the Chroma server's retrieval tools with the deterministic hashing embedder.
+# Run from the project root:
+#   python ./benchmarks/bench_retrieval.py --scale 200 --windows 0 1 2
+import argparse
+import inspect
+import json
+import os
+import random
+import re
+import resource
+import sqlite3
+import statistics
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+os.chdir(ROOT)
+sys.path.insert(0, str(ROOT / "servers"))
+
+# Everything below runs without network access: hashing embedder, separate DB copy and caches
+os.environ.setdefault("EMBEDDING_BACKEND", "hash")
+os.environ.setdefault("CHROMA_PERSIST_DIR", "./data/test_db_hash")
+os.environ.setdefault("EMBEDDING_CACHE_PATH", "./data/bench_embedding_cache.db")
+os.environ.setdefault("LEXICAL_INDEX_PATH", "./data/bench_lexical_index.pkl")
+os.environ.setdefault("TABLE_STORE_PATH", "./data/bench_table_cells.db")
+# Memory-only result cache, so neither the production cache file nor an earlier benchmark run is reused
+os.environ.setdefault("RETRIEVAL_CACHE_PATH", "")
+
+TOOLS = ("broadened_year_retrieval", "table_retrieval", "hybrid_retrieval")
+
+
+def ensure_hash_db(source_dir: str = "./data/test_db"):
+    target_dir = os.environ["CHROMA_PERSIST_DIR"]
+    if not Path(target_dir).exists():
+        from rebuild_db import rebuild
+        print(f"Building {target_dir} with the '{os.environ['EMBEDDING_BACKEND']}' backend...")
+        rebuild(source_dir, target_dir, os.environ["EMBEDDING_BACKEND"])
+
+
+def qa_workload():
+    """(question, ticker, year) for every QA item naming a company from companies.db and a year."""
+    conn = sqlite3.connect("./data/companies.db")
+    securities = conn.execute("SELECT Security, Symbol FROM companies").fetchall()
+    conn.close()
+    with open("./data/qa_dict_diff.json", "r") as f:
+        qa_dict_diff = json.load(f)
+
+    workload = []
+    for item in qa_dict_diff:
+        question = item['Question']
+        year_match = re.search(r'\b(19|20)\d{2}\b', question)
+        symbols = [symbol for security, symbol in securities if security.lower() in question.lower()]
+        if year_match and symbols:
+            workload.append((question, symbols[0], int(year_match.group())))
+    return workload
+
+
+def synthetic_workload(base, partitions, size, seed=0):
+    """Scaled-up workload: QA questions paired with random (ticker, year) partitions that exist in the DB."""
+    rng = random.Random(seed)
+    keys = sorted({(company, fiscal) for company, fiscal, _ in partitions if company and fiscal})
+    return [(rng.choice(base)[0], *rng.choice(keys)) for _ in range(size)]
+
+
+def run(tool, workload, window):
+    latencies = []
+    start = time.perf_counter()
+    for question, ticker, year in workload:
+        call_start = time.perf_counter()
+        tool(question=question, ticker=ticker, target_year=year, window=window)
+        latencies.append((time.perf_counter() - call_start) * 1000)
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        'calls': len(latencies),
+        'p50_ms': round(statistics.median(latencies), 3),
+        'p95_ms': round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 3),
+        'throughput_per_s': round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        'max_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the retrieval tools offline")
+    parser.add_argument("--scale", type=int, default=200, help="number of calls in the synthetic workload")
+    parser.add_argument("--windows", type=int, nargs="+", default=[0, 1, 2])
+    parser.add_argument("--cached", action="store_true", help="keep the retrieval result cache in front of the tools")
+    parser.add_argument("--output", default="", help="optional JSON file for the results")
+    args = parser.parse_args()
+
+    ensure_hash_db()
+    load_start = time.perf_counter()
+    import chroma_server_final as server
+    index = server.get_partition_index()
+    print(f"Server loaded in {time.perf_counter() - load_start:.2f}s, {len(index.ids)} documents, "
+          f"{len(index.partitions)} partitions, max RSS {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.1f} MB")
+
+    qa = qa_workload()
+    workloads = {
+        'qa': qa,
+        'synthetic': synthetic_workload(qa, index.partitions, args.scale)
+    }
+
+    results = []
+    print(f"\n{'tool':<26}{'workload':<11}{'window':>6}{'calls':>7}{'p50 ms':>10}{'p95 ms':>10}{'calls/s':>10}{'RSS MB':>9}")
+    for tool_name in TOOLS:
+        tool = getattr(server, tool_name)
+        if not args.cached:
+            tool = inspect.unwrap(tool)  # skip the instrumentation and result-cache wrappers
+        for workload_name, workload in workloads.items():
+            for window in args.windows:
+                row = {'tool': tool_name, 'workload': workload_name, 'window': window, **run(tool, workload, window)}
+                results.append(row)
+                print(f"{tool_name:<26}{workload_name:<11}{window:>6}{row['calls']:>7}{row['p50_ms']:>10.2f}"
+                      f"{row['p95_ms']:>10.2f}{row['throughput_per_s']:>10.1f}{row['max_rss_mb']:>9.1f}")
+
+    print(f"\nEmbedding cache: {server.embeddings.stats()}")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=4)
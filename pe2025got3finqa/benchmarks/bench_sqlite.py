@@ -0,0 +1,78 @@
+# bench_sqlite.py
+# Per-call latency of metadata lookups on companies.db: a fresh connection per call (the old
+# SQLiteConnection behaviour) against the shared read-only pool. Run from the project root:
+#   python ./benchmarks/bench_sqlite.py --calls 2000
+import argparse
+import json
+import os
+import sqlite3
+import statistics
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+os.chdir(ROOT)
+sys.path.insert(0, str(ROOT / "servers"))
+
+from sqlite_pool import ReadOnlyPool
+
+DB_PATH = Path("./data/companies.db")
+# Typical agent lookups: one company, a sector screen, a range screen on an indexed column
+QUERIES = [
+    ('SELECT * FROM companies WHERE Symbol = ?', ['AAPL']),
+    ('SELECT Security, "Market cap" FROM companies WHERE Sector LIKE ? LIMIT 1000', ['%technology%']),
+    ('SELECT Security FROM companies WHERE "P/E" BETWEEN ? AND ? AND Founded BETWEEN ? AND ? LIMIT 1000', [10, 20, 1990, 1999])
+]
+
+
+def fresh_call(query, params):
+    if not DB_PATH.exists():
+        raise FileNotFoundError(DB_PATH)
+    conn = sqlite3.connect(str(DB_PATH))
+    conn.row_factory = sqlite3.Row
+    try:
+        return [dict(row) for row in conn.execute(query, params).fetchall()]
+    finally:
+        conn.close()
+
+
+def pooled_call(pool):
+    def call(query, params):
+        with pool.connection() as conn:
+            return [dict(row) for row in conn.execute(query, params).fetchall()]
+    return call
+
+
+def run(call, calls):
+    latencies = []
+    for i in range(calls):
+        query, params = QUERIES[i % len(QUERIES)]
+        start = time.perf_counter()
+        call(query, params)
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    return {
+        'calls': len(latencies),
+        'mean_ms': round(statistics.mean(latencies), 4),
+        'p50_ms': round(statistics.median(latencies), 4),
+        'p95_ms': round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 4)
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark fresh against pooled SQLite connections")
+    parser.add_argument("--calls", type=int, default=2000)
+    parser.add_argument("--output", default="", help="optional JSON file for the results")
+    args = parser.parse_args()
+
+    results = {
+        'fresh': run(fresh_call, args.calls),
+        'pooled': run(pooled_call(ReadOnlyPool(DB_PATH)), args.calls)
+    }
+    print(f"{'mode':<8}{'calls':>7}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}")
+    for mode, row in results.items():
+        print(f"{mode:<8}{row['calls']:>7}{row['mean_ms']:>10.4f}{row['p50_ms']:>10.4f}{row['p95_ms']:>10.4f}")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=4)
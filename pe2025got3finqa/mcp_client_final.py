@@ -8,9 +8,17 @@ from langchain_mcp_adapters.client import MultiServerMCPClient
 import json
 from dotenv import load_dotenv, find_dotenv
 import os
+import sys
+import time
+from collections import defaultdict
+from tracing import TraceRecorder, write_traces, print_trace_summary
+from replay import CassetteRecorder, ReplayChatModel, load_cassette, save_cassette, compare_tool_calls
 
 _ = load_dotenv(find_dotenv())
 
+# Consoles with a legacy code page (e.g. cp949) cannot print every character of a result; escape them instead of crashing
+sys.stdout.reconfigure(errors="backslashreplace")
+
 with open('./data/qa_dict_diff.json', 'r') as f:
     qa_dict_diff = json.load(f)
 
@@ -18,43 +26,83 @@ results_list = [None] * len(qa_dict_diff)
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
-model = ChatOpenAI(model="gpt-4o-mini", api_key=OPENAI_API_KEY)
-
-async def async_func():
-    async with MultiServerMCPClient(
-        {
-            "math": {
-                "command": "python",
-                "args": ["./servers/math_server.py"],
-                "transport": "stdio",
-            },
-            "fin": {
-                "command": "python",
-                "args": ["./servers/fin_server.py"],
-                "transport": "stdio",
-            },
-            "chroma": {
-                "command": "python",
-                "args": ["./servers/chroma_server_final.py"],
-                "transport": "stdio",
-            },
-            "sqlite": {
-                "command": "python",
-                "args": ["./servers/sqlite_server.py"],
-                "transport": "stdio",
-            }, 
-            "multi_query": {
-                "command": "python",
-                "args": ["./servers/query_diff_server.py"],
-                "transport": "stdio",
-            }
-        }
-    ) as client:
-        for i, item in enumerate(qa_dict_diff):
-
-            #if item['level_rating'] !=3:
-            #   continue
-            agent = create_react_agent(model, client.get_tools(), prompt='''You are a financial expert agent. You will also be given a level_rating integer (1~5) alongside the user query.
+# LLM_MODE: "live" calls the API, "record" also writes every model response and tool call to CASSETTE_PATH,
+# "replay" answers from that cassette without network access while the MCP servers still run for real
+LLM_MODE = os.getenv("LLM_MODE", "live")
+CASSETTE_PATH = os.getenv("CASSETTE_PATH", "./data/cassette.json")
+# Model responses and tool calls of this run, keyed by question prompt
+cassette = {}
+
+if LLM_MODE == "replay":
+    recorded_cassette = load_cassette(CASSETTE_PATH)
+    model = ReplayChatModel(cassette=recorded_cassette)
+else:
+    model = ChatOpenAI(model="gpt-4o-mini", api_key=OPENAI_API_KEY)
+
+# Number of questions driven concurrently over the shared MCP sessions (1 = sequential)
+MAX_CONCURRENCY = int(os.getenv("MAX_CONCURRENCY", "4"))
+# Per-question timeout in seconds for a whole ReAct trajectory
+QUESTION_TIMEOUT = float(os.getenv("QUESTION_TIMEOUT", "300"))
+
+# Every finished question is appended here as one JSON line, so an interrupted run loses nothing
+CHECKPOINT_PATH = os.getenv("CHECKPOINT_PATH", "./data/results_checkpoint.jsonl")
+# RESUME=1 skips questions already answered in the checkpoint instead of starting it over
+RESUME = os.getenv("RESUME", "0") == "1"
+
+def load_checkpoint():
+    """Fill results_list from the checkpoint and return the indices already answered."""
+    done = set()
+    if not os.path.exists(CHECKPOINT_PATH):
+        return done
+    with open(CHECKPOINT_PATH, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # a line cut short by a crash
+            i = record['index']
+            # Skip records from a different QA set
+            if i < len(qa_dict_diff) and qa_dict_diff[i]['Question'] == record['Question']:
+                results_list[i] = record['Output']
+                done.add(i)
+    return done
+
+def append_checkpoint(i, output):
+    with open(CHECKPOINT_PATH, 'a', encoding='utf-8') as f:
+        f.write(json.dumps({'index': i, 'Question': qa_dict_diff[i]['Question'], 'Output': output}) + "\n")
+
+# Per-question step traces: one JSON line per question plus a Chrome trace (chrome://tracing or Perfetto)
+TRACE_PATH = os.getenv("TRACE_PATH", "./data/traces.jsonl")
+CHROME_TRACE_PATH = os.getenv("CHROME_TRACE_PATH", "./data/traces_chrome.json")
+# VERBOSE=1 prints the full LangGraph message dump of every question
+VERBOSE = os.getenv("VERBOSE", "0") == "1"
+trace_recorders = []
+
+# Wall-clock seconds spent building agents vs. running them, reported at the end of a run
+timings = defaultdict(list)
+
+# Agents built so far, keyed by (model, tool set, prompt)
+_agent_cache = {}
+
+def get_agent(model, tools, prompt):
+    """Return a ReAct agent for (model, tools, prompt), building it only on first use."""
+    key = (id(model), tuple(sorted(tool.name for tool in tools)), prompt)
+    if key not in _agent_cache:
+        start = time.perf_counter()
+        _agent_cache[key] = create_react_agent(model, tools, prompt=prompt)
+        timings['construction'].append(time.perf_counter() - start)
+    return _agent_cache[key]
+
+def print_timing_report():
+    construction = timings['construction']
+    invocation = timings['invocation']
+    print("\nAgent Timing Report:")
+    print(f"  Construction: {len(construction)} build(s), total {sum(construction):.3f}s")
+    if invocation:
+        print(f"  Invocation:   {len(invocation)} question(s), total {sum(invocation):.3f}s, "
+              f"mean {sum(invocation) / len(invocation):.3f}s, max {max(invocation):.3f}s")
+
+AGENT_PROMPT = '''You are a financial expert agent. You will also be given a level_rating integer (1~5) alongside the user query.
 Follow these steps carefully when answering any user query:
 
 ① Extract Target Year and Focus - regardless of the level_rating
@@ -71,7 +119,9 @@ Use the broadened_year_retrieval tool to retrieve relevant financial data not on
 
 From the retrieved multi-year results, **identify and select the single most relevant data point for the user query**.
 
-If the query requires Operating Profit Margin calculations or current ratio calculations, use ***ONLY*** the table_retrieval tool (Do Not Use the broadened_year_retrieval tool) in the chroma_server because all of the important information is in the table data.
+If the query requires Operating Profit Margin calculations or current ratio calculations, the important information is in the table data, so do not use the broadened_year_retrieval tool:
+1. First use the table_cell_lookup tool in the chroma_server once per needed line item (e.g. "operating income" and "net sales", or "total current assets" and "total current liabilities"). It returns the exact values already parsed from the tables, so there is no table to read.
+2. Only if table_cell_lookup returns no value for a line item, use the table_retrieval tool and read that value from the retrieved table.
 
 If the query does **not** require Operating Profit Margin or current ratio calculations, **do not** use the table_retrieval tool.
                                                                                                                                                             
@@ -93,6 +143,7 @@ Explicitly mention in your answer:
 ③Perform Calculations
 
 If the query involves general mathematical calculations ***for level_rating of 2 or higher***, use the tools in the math_server.
+When a calculation takes more than one arithmetic step (e.g. a percentage change), compute the whole formula in a single evaluate_expression call with named variables instead of chaining the two-operand tools.
                                               
 If the query specifically requires financial calculations (e.g. current ratio, operating profit margin) ***for the level_rating of 3 or higher***, use the tools in the fin_server.
                                        
@@ -117,7 +168,11 @@ Remember, you must strictly follow the schema of the companies.db, which has:
 
 Table: companies
 
-Columns: Symbol, Security, Market cap, Price, Volume, Rel Volume, P/E, Sector, Headquarters Location, Founded
+Columns: Symbol, Security, Market cap, Price, Volume, Rel Volume, P/E, Sector, Headquarters Location, HQ City, HQ State, Founded, Founded Note
+
+Market cap (in USD, e.g. 29220000000.0 for 29.22 B), Price (USD), Rel Volume and P/E are numbers, Volume and Founded (first founding year) are integers, so compare them numerically (e.g. "Market cap" > 100e9). Quote column names containing spaces or slashes.
+For screening questions (filters on sector, founding years, P/E, market cap, price or headquarters, then the largest/smallest or an average), use a single screen_companies call instead of several read_query calls.
+For other broad queries, pass only the needed columns and a page_size to read_query and follow next_page_token only if the first page is not enough.
                                        
 ⑥ Handle Multi-Hop Cross-Document Queries - for level_rating of 4 or higher
 When encountering complex queries that span multiple documents and require information from different companies to answer a single question:
@@ -133,7 +188,7 @@ Number and track each subquestion for systematic processing
 Sequential Data Retrieval:
 
 For each generated subquestion, follow the standard retrieval process (steps ①-②)
-Use appropriate tools (broadened_year_retrieval, table_retrieval, etc.) for each company's data
+Use appropriate tools (broadened_year_retrieval, table_cell_lookup, table_retrieval, etc.) for each company's data
 Store intermediate results with clear company identification and data source tracking
 Maintain data integrity by keeping each company's information separate
 
@@ -171,13 +226,142 @@ Which tools were applied.
 The source of the retrieved information.
 If you processed multiple subquestions, aggregate the results into a clear, coherent summary.
 You must always use the tools systematically and never guess or hallucinate data that was not retrieved from the databases or calculated by the tools.'''
-)
-            result = await agent.ainvoke({"messages": f"LEVEL RATING: {item['level_rating']}\n\n{item['Question']}",  "remaining_steps": 10}, config={"recursion_limit": 50})
+
+
+async def run_question(i, item, agent, semaphore):
+    async with semaphore:
+        #if item['level_rating'] !=3:
+        #   return
+        start = time.perf_counter()
+        recorder = TraceRecorder(i, item['Question'])
+        trace_recorders.append(recorder)
+        try:
+            result = await asyncio.wait_for(
+                agent.ainvoke({"messages": f"LEVEL RATING: {item['level_rating']}\n\n{item['Question']}",  "remaining_steps": 10}, config={"recursion_limit": 50, "callbacks": [recorder, CassetteRecorder(cassette)]}),
+                timeout=QUESTION_TIMEOUT
+            )
+        except asyncio.TimeoutError:
+            print(f"⚠ Timeout after {QUESTION_TIMEOUT}s on question {i} → '{item['Question'][:50]}...'")
+            return
+        except Exception as e:
+            # One failing question must not take down the rest of the run
+            print(f"⚠ Error on question {i} → '{item['Question'][:50]}...': {type(e).__name__}: {str(e)}")
+            return
+        finally:
+            timings['invocation'].append(time.perf_counter() - start)
+            recorder.finish()
+        if VERBOSE:
             print(result)
-            results_list[i] = result['messages'][-1].content
-            # print(results_list[i])
+        else:
+            record = recorder.to_record()
+            print(f"✅ Q{i} done in {record['duration_ms'] / 1000:.2f}s: {record['llm_calls']} LLM call(s), {record['tool_calls']} tool call(s)")
+        results_list[i] = result['messages'][-1].content
+        append_checkpoint(i, results_list[i])
+        # print(results_list[i])
+
+# server name → server_stats snapshot, collected after all questions have run
+server_stats = {}
+SERVER_STATS_PATH = os.getenv("SERVER_STATS_PATH", "./data/server_stats.json")
+
+async def collect_server_stats(client):
+    if CALC_MODE == "inprocess":
+        server_stats['calc'] = calc_server.stats.snapshot()
+    for name, session in client.sessions.items():
+        try:
+            result = await session.call_tool("server_stats", {})
+            server_stats[name] = json.loads(result.content[0].text)
+        except Exception as e:
+            print(f"⚠ Could not collect stats from server '{name}': {str(e)}")
+
+def print_server_stats_report():
+    print("\nPer-Tool Server Report:")
+    rows = [
+        (server, tool, entry)
+        for server, snapshot in server_stats.items()
+        for tool, entry in snapshot['tools'].items()
+    ]
+    for server, tool, entry in sorted(rows, key=lambda row: row[2]['total_ms'], reverse=True):
+        print(f"  {server}.{tool}: {entry['calls']} call(s), {entry['errors']} error(s), "
+              f"mean {entry['mean_ms']:.1f}ms, p95 {entry['p95_ms']:.1f}ms, total {entry['total_ms'] / 1000:.2f}s, "
+              f"{entry['bytes_in']}B in / {entry['bytes_out']}B out")
+    for server, snapshot in server_stats.items():
+        for name, extra in snapshot.get('extras', {}).items():
+            print(f"  {server}.{name}: {extra}")
+    with open(SERVER_STATS_PATH, 'w') as f:
+        json.dump(server_stats, f, indent=4)
+
+# CALC_MODE: "inprocess" runs the math and fin tools inside this process, "server" spawns them as one
+# calc_server.py subprocess, "separate" spawns math_server.py and fin_server.py as before
+CALC_MODE = os.getenv("CALC_MODE", "inprocess")
+if CALC_MODE == "inprocess":
+    sys.path.insert(0, "./servers")
+    import calc_server
+
+def calc_servers():
+    if CALC_MODE == "inprocess":
+        return {}
+    if CALC_MODE == "server":
+        return {"calc": {"command": "python", "args": ["./servers/calc_server.py"], "transport": "stdio"}}
+    return {
+        "math": {"command": "python", "args": ["./servers/math_server.py"], "transport": "stdio"},
+        "fin": {"command": "python", "args": ["./servers/fin_server.py"], "transport": "stdio"}
+    }
+
+async def async_func():
+    async with MultiServerMCPClient(
+        {
+            **calc_servers(),
+            "chroma": {
+                "command": "python",
+                "args": ["./servers/chroma_server_final.py"],
+                "transport": "stdio",
+            },
+            "sqlite": {
+                "command": "python",
+                "args": ["./servers/sqlite_server.py"],
+                "transport": "stdio",
+            }, 
+            "multi_query": {
+                "command": "python",
+                "args": ["./servers/query_server_diff.py"],
+                "transport": "stdio",
+            }
+        }
+    ) as client:
+        # Tools are listed and the graph is compiled once; every question reuses the same agent.
+        # server_stats exists on every server and is for the run report only, not for the agent.
+        tools = [tool for tool in client.get_tools() if tool.name != 'server_stats']
+        if CALC_MODE == "inprocess":
+            tools += calc_server.langchain_tools()
+        agent = get_agent(model, tools, AGENT_PROMPT)
+        semaphore = asyncio.Semaphore(MAX_CONCURRENCY)
+        # Results are stored by index, so output order matches qa_dict_diff regardless of completion order
+        await asyncio.gather(*(
+            run_question(i, item, agent, semaphore)
+            for i, item in enumerate(qa_dict_diff)
+            if i not in done
+        ))
+        await collect_server_stats(client)
+
+if RESUME:
+    done = load_checkpoint()
+    print(f"Resuming: {len(done)}/{len(qa_dict_diff)} questions already answered in {CHECKPOINT_PATH}")
+else:
+    done = set()
+    open(CHECKPOINT_PATH, 'w').close()
 
 asyncio.run(async_func())
+print_timing_report()
+print_server_stats_report()
+write_traces(trace_recorders, TRACE_PATH, CHROME_TRACE_PATH)
+print_trace_summary(trace_recorders)
+
+if LLM_MODE == "record":
+    save_cassette(cassette, CASSETTE_PATH)
+    print(f"✅ Recorded {len(cassette)} question(s) to {CASSETTE_PATH}")
+elif LLM_MODE == "replay":
+    mismatches = compare_tool_calls(recorded_cassette, cassette)
+    print(f"Replay: {len(cassette)} question(s) replayed from {CASSETTE_PATH}, {mismatches} tool call(s) differ from the recording")
 
 output_data = []
 for i, item in enumerate(qa_dict_diff):
@@ -188,3 +372,7 @@ for i, item in enumerate(qa_dict_diff):
 
 with open('./data/results.json', 'w') as f:
     json.dump(output_data, f, indent=4)
+
+missing = sum(1 for output in results_list if output is None)
+if missing:
+    print(f"⚠ {missing} question(s) without an answer; rerun with RESUME=1 to retry only those")
@@ -0,0 +1,111 @@
+# replay.py
+# Record/replay of model responses and tool calls, so end-to-end runs can be repeated offline.
+# A cassette maps each question prompt to the AI messages the model returned at every step
+# and to the tool calls (name, arguments, output) made while answering it.
+import json
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, message_to_dict, messages_from_dict
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+
+def question_key(messages) -> str:
+    """The first human message identifies the question; the system prompt is not part of the key."""
+    return next(message.content for message in messages if message.type == 'human')
+
+
+class CassetteRecorder(BaseCallbackHandler):
+    """Callback handler capturing the model responses and tool calls of one question into a shared cassette."""
+
+    run_inline = True
+
+    def __init__(self, cassette: Dict[str, Any]):
+        self.cassette = cassette
+        self._llm_runs = {}
+        self._tool_runs = {}
+        self._key = None
+
+    def _entry(self, key):
+        return self.cassette.setdefault(key, {'llm': [], 'tools': []})
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        batch = messages[0]
+        self._key = question_key(batch)
+        step = sum(1 for message in batch if message.type == 'ai')
+        self._llm_runs[run_id] = (self._key, step)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        key, step = self._llm_runs.pop(run_id, (None, None))
+        if key is None:
+            return
+        steps = self._entry(key)['llm']
+        steps.extend([None] * (step + 1 - len(steps)))
+        steps[step] = message_to_dict(response.generations[0][0].message)
+
+    def on_tool_start(self, serialized, input_str, *, run_id, **kwargs):
+        self._tool_runs[run_id] = {'name': (serialized or {}).get('name', 'tool'), 'args': kwargs.get('inputs') or input_str}
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        call = self._tool_runs.pop(run_id, None)
+        if call is None or self._key is None:
+            return
+        content = getattr(output, 'content', output)
+        call['output'] = content if isinstance(content, str) else json.dumps(content, default=str)
+        self._entry(self._key)['tools'].append(call)
+
+
+class ReplayChatModel(BaseChatModel):
+    """
+    Chat model that answers from a cassette instead of calling an API.
+
+    The response for a request is looked up by its question and by the number of AI messages
+    already in the conversation, so replay is deterministic even when questions run concurrently.
+    """
+
+    cassette: Dict[str, Any]
+
+    @property
+    def _llm_type(self) -> str:
+        return "replay"
+
+    def _generate(self, messages, stop: Optional[List[str]] = None, run_manager=None, **kwargs) -> ChatResult:
+        key = question_key(messages)
+        step = sum(1 for message in messages if message.type == 'ai')
+        steps = self.cassette.get(key, {}).get('llm', [])
+        if step >= len(steps) or steps[step] is None:
+            raise KeyError(f"No recorded response for step {step} of question '{key[:60]}...'")
+        message = messages_from_dict([steps[step]])[0]
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(
+            content=message.content,
+            tool_calls=message.tool_calls,
+            usage_metadata=message.usage_metadata,
+            response_metadata=message.response_metadata
+        ))])
+
+    def bind_tools(self, tools, **kwargs):
+        # Recorded responses already carry their tool calls
+        return self
+
+
+def load_cassette(path: str) -> Dict[str, Any]:
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_cassette(cassette: Dict[str, Any], path: str):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(cassette, f, indent=2)
+
+
+def compare_tool_calls(recorded: Dict[str, Any], replayed: Dict[str, Any]) -> int:
+    """Number of tool calls whose replayed (name, output) has no counterpart in the recording of the same question."""
+    mismatches = 0
+    for key, entry in replayed.items():
+        # Parallel tool calls can finish in any order, so compare as multisets
+        expected = Counter((call['name'], call['output']) for call in recorded.get(key, {}).get('tools', []))
+        actual = Counter((call['name'], call['output']) for call in entry['tools'])
+        mismatches += sum((actual - expected).values()) + sum((expected - actual).values())
+    return mismatches
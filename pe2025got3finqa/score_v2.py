@@ -4,7 +4,13 @@ import json
 from pydantic import BaseModel, Field
 from dotenv import load_dotenv, find_dotenv
 import os
+import asyncio
+import random
+import re
+import hashlib
+import sqlite3
 from collections import defaultdict
+from openai import RateLimitError, APITimeoutError, APIConnectionError
 _ = load_dotenv(find_dotenv())
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
@@ -46,35 +52,189 @@ class Score(BaseModel):
 
 score_answer_chain = score_answer_prompt | llm.with_structured_output(Score)
 
-correct = 0
-evaluated = 0
-results_with_score = []
+# Number of judge calls in flight at the same time
+SCORE_CONCURRENCY = int(os.getenv("SCORE_CONCURRENCY", "8"))
+# Retries with exponential backoff on rate limits and transient API errors
+SCORE_MAX_RETRIES = int(os.getenv("SCORE_MAX_RETRIES", "5"))
 
-# NEW: per-level tracking
-level_correct = defaultdict(int)
-level_total = defaultdict(int)
+# Score clearly matched (or clearly missing) numeric answers locally instead of calling the judge
+PRESCORE = os.getenv("PRESCORE", "1") == "1"
+# Relative tolerance for the local numeric match (covers rounding such as 18.698 ≈ 18.7)
+PRESCORE_TOLERANCE = float(os.getenv("PRESCORE_TOLERANCE", "0.01"))
+
+SCALE_WORDS = {'thousand': 1e3, 'million': 1e6, 'billion': 1e9, 'trillion': 1e12}
+NUMBER_WITH_UNIT = re.compile(
+    r'(?<![\w.])(-?\d{1,3}(?:,\d{3})+(?:\.\d+)?|-?\d+(?:\.\d+)?)\s*(%|percent\b|thousand|million|billion|trillion)?',
+    re.IGNORECASE
+)
+
+def normalize_unit(unit):
+    unit = unit.lower()
+    return '%' if unit in ('%', 'percent') else unit
+
+def extract_numbers(text):
+    """Return (value, unit) pairs, where unit is '%', a scale word or '' for a bare number."""
+    # Some answers in the QA set are stored as JSON numbers rather than strings
+    return [
+        (float(number.replace(',', '')), normalize_unit(unit))
+        for number, unit in NUMBER_WITH_UNIT.findall("" if text is None else str(text))
+    ]
+
+# "rank 3", "score 1.0534", "score of 0.98": the agent states these in every answer
+RANK_OR_SCORE = re.compile(r'\b(?:rank(?:ed)?|score[ds]?)\b(?:\s+of)?[\s:=#(]*$', re.IGNORECASE)
+LIST_MARKER_END = re.compile(r'[.)]\s')
+
+def response_numbers(text):
+    """
+    Like extract_numbers, but without the numbers that are never the answer:
+    bare years, numbers labelled as rank or score, and list markers such as "1." or "2)".
+    """
+    text = "" if text is None else str(text)
+    numbers = []
+    for match in NUMBER_WITH_UNIT.finditer(text):
+        value, unit = float(match.group(1).replace(',', '')), normalize_unit(match.group(2) or '')
+        before = text[:match.start()]
+        if unit == '' and value.is_integer() and 1900 <= value <= 2100:
+            continue  # bare years are everywhere in responses
+        if RANK_OR_SCORE.search(before[-30:]):
+            continue
+        at_line_start = not before[before.rfind('\n') + 1:].strip()
+        if unit == '' and at_line_start and LIST_MARKER_END.match(text, match.end()):
+            continue
+        numbers.append((value, unit))
+    return numbers
+
+def close(a, b):
+    return abs(a - b) <= PRESCORE_TOLERANCE * max(abs(a), abs(b))
+
+def numeric_prescore(answer, response):
+    """
+    Score a response without the LLM judge when the outcome is clear.
+
+    Returns 1 if the answer's value appears in the response (after normalizing million/billion/%)
+    and no other number of the same unit contradicts it, 0 if the answer is numeric and the
+    response contains no number at all, and None when the case is ambiguous and has to go to
+    the judge.
+    """
+    expected = extract_numbers(answer)
+    if len(expected) != 1:
+        return None  # non-numeric (e.g. a company name) or compound answers go to the judge
+    value, unit = expected[0]
+    # Short bare values like "2" also appear as counts, steps or table references
+    bare_trusted = len(re.sub(r'\D', '', f"{abs(value):g}").lstrip('0')) >= 3
+
+    if not extract_numbers(response):
+        return 0
+
+    matched, contradicting = False, False
+    for candidate, candidate_unit in response_numbers(response):
+        if candidate_unit == '' and not bare_trusted:
+            continue
+        if unit == '%':
+            if candidate_unit not in ('%', ''):
+                continue
+            same_unit = candidate_unit == '%'
+            hit = close(candidate, value) if same_unit else close(candidate * 100, value)
+        elif unit in SCALE_WORDS:
+            if candidate_unit == '%':
+                continue
+            same_unit = candidate_unit in SCALE_WORDS
+            hit = close(candidate * SCALE_WORDS[candidate_unit], value * SCALE_WORDS[unit]) if same_unit \
+                else close(candidate, value)
+        else:
+            same_unit = candidate_unit == ''
+            hit = close(candidate * SCALE_WORDS[candidate_unit], value) if candidate_unit in SCALE_WORDS \
+                else close(candidate, value)
+        if hit:
+            matched = True
+        elif same_unit:
+            # Another figure of the same kind, e.g. an input value echoed next to the result
+            contradicting = True
+    return 1 if matched and not contradicting else None
 
+# Judge verdicts keyed by a hash of (judge model, judge prompt, question, answer, response); SCORE_CACHE=0 bypasses it
+SCORE_CACHE = os.getenv("SCORE_CACHE", "1") == "1"
+SCORE_CACHE_PATH = os.getenv("SCORE_CACHE_PATH", "./data/score_cache.db")
+
+score_cache = None
+if SCORE_CACHE:
+    score_cache = sqlite3.connect(SCORE_CACHE_PATH)
+    score_cache.execute("CREATE TABLE IF NOT EXISTS scores (key TEXT PRIMARY KEY, score INTEGER NOT NULL)")
+
+def score_cache_key(question, answer, response):
+    content = json.dumps([llm.model_name, score_answer_prompt.template, question, str(answer), response])
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+scoring_counts = defaultdict(int)
+
+async def score_one(question, answer, response, semaphore):
+    if PRESCORE:
+        score = numeric_prescore(answer, response)
+        if score is not None:
+            scoring_counts[f'local_{score}'] += 1
+            return score
+    scoring_counts['judge'] += 1
+
+    if score_cache is not None:
+        key = score_cache_key(question, answer, response)
+        row = score_cache.execute("SELECT score FROM scores WHERE key = ?", (key,)).fetchone()
+        if row is not None:
+            scoring_counts['cache_hit'] += 1
+            return row[0]
+
+    async with semaphore:
+        for attempt in range(SCORE_MAX_RETRIES + 1):
+            try:
+                score = (await score_answer_chain.ainvoke({
+                    'question': question,
+                    'answer': answer,
+                    'response': response
+                })).score
+                # Only real verdicts are cached, never the error fallback
+                if score_cache is not None:
+                    score_cache.execute("INSERT OR REPLACE INTO scores (key, score) VALUES (?, ?)", (key, score))
+                    score_cache.commit()
+                return score
+            except (RateLimitError, APITimeoutError, APIConnectionError) as e:
+                if attempt == SCORE_MAX_RETRIES:
+                    print(f"⚠ Error scoring question → '{question[:50]}...': {str(e)}")
+                    return 0  # Fallback score once retries are exhausted
+                delay = min(2 ** attempt, 30) + random.uniform(0, 1)
+                print(f"⚠ {type(e).__name__} scoring question → '{question[:50]}...', retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+            except Exception as e:
+                print(f"⚠ Error scoring question → '{question[:50]}...': {str(e)}")
+                return 0  # Fallback score on error
+
+async def score_all(pairs):
+    semaphore = asyncio.Semaphore(SCORE_CONCURRENCY)
+    # gather keeps the input order, so the report and output file match the sequential run
+    return await asyncio.gather(*(
+        score_one(question, qa_item['Answer'], result_item.get('Output', ""), semaphore)
+        for question, qa_item, result_item in pairs
+    ))
+
+pairs = []
 for question, qa_item in qa_dict_map.items():
-    level_rating = qa_item.get('level_rating', 'N/A')
-    #if level_rating!=3:
+    #if qa_item.get('level_rating', 'N/A')!=3:
     #    continue
     if question not in results_map:
         print(f"⚠ Warning: No matching result for question → '{question[:50]}...'")
         continue
+    pairs.append((question, qa_item, results_map[question]))
 
-    result_item = results_map[question]
-    response = result_item.get('Output', "")
-    level_rating = qa_item.get('level_rating', 'N/A')
+scores = asyncio.run(score_all(pairs))
 
-    try:
-        score = score_answer_chain.invoke({
-            'question': question,
-            'answer': qa_item['Answer'],
-            'response': response
-        }).score
-    except Exception as e:
-        print(f"⚠ Error scoring question → '{question[:50]}...': {str(e)}")
-        score = 0  # Fallback score on error
+correct = 0
+evaluated = 0
+results_with_score = []
+
+# NEW: per-level tracking
+level_correct = defaultdict(int)
+level_total = defaultdict(int)
+
+for (question, qa_item, result_item), score in zip(pairs, scores):
+    level_rating = qa_item.get('level_rating', 'N/A')
 
     correct += score
     evaluated += 1
@@ -101,6 +261,16 @@ for level in sorted(level_total.keys()):
     level_accuracy = correct_count / count if count > 0 else 0.0
     print(f"  Level {level}: {correct_count}/{count} correct → Accuracy: {level_accuracy:.4f}")
 
+if PRESCORE:
+    avoided = scoring_counts['local_1'] + scoring_counts['local_0']
+    print(f"\nNumeric Pre-Scorer: {avoided}/{evaluated} judge calls avoided "
+          f"({scoring_counts['local_1']} matched, {scoring_counts['local_0']} missing a number), "
+          f"{scoring_counts['judge']} escalated to the LLM judge")
+
+if score_cache is not None:
+    print(f"Judge Verdict Cache: {scoring_counts['cache_hit']}/{scoring_counts['judge']} judge calls served from {SCORE_CACHE_PATH}")
+    score_cache.close()
+
 with open('./data/results_with_diff.json', 'w') as f:
     json.dump(results_with_score, f, indent=4)
     print(f"✅ Results with score saved to results_with_diff.json")
@@ -0,0 +1,40 @@
+# calc_server.py
+# The arithmetic tools of math_server.py and the financial formulas of fin_server.py in a single process.
+# Run it as one MCP server (`python ./servers/calc_server.py`), or call `langchain_tools()` to
+# give the agent the same tools in-process without any JSON-RPC round trip.
+import inspect
+from typing import Callable, Iterator, Tuple
+
+from mcp.server.fastmcp import FastMCP
+from instrumentation import instrument
+import fin_server
+import math_server
+
+mcp = FastMCP("Calc")
+# Times every tool below and adds the server_stats tool
+stats = instrument(mcp)
+
+
+def tool_functions() -> Iterator[Tuple[Callable, str]]:
+    """(function, description) of every math and fin tool, without the standalone servers' instrumentation."""
+    for server in (math_server, fin_server):
+        for tool in server.mcp._tool_manager.list_tools():
+            if tool.name != 'server_stats':
+                yield inspect.unwrap(tool.fn), tool.description
+
+
+for fn, description in tool_functions():
+    mcp.tool(description=description)(fn)
+
+
+def langchain_tools():
+    """The same tools as LangChain tools running in the caller's process, timed into `stats`."""
+    from langchain_core.tools import StructuredTool
+    return [
+        StructuredTool.from_function(func=stats.wrap(fn), name=fn.__name__, description=description)
+        for fn, description in tool_functions()
+    ]
+
+
+if __name__ == "__main__":
+    mcp.run(transport="stdio")
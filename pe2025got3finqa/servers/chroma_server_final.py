@@ -1,26 +1,111 @@
 # chroma_server.py
 from mcp.server.fastmcp import FastMCP
+from instrumentation import instrument
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain.embeddings.openai import OpenAIEmbeddings
 from langchain.vectorstores import Chroma
 from dotenv import load_dotenv, find_dotenv
 import os
-from typing import List, Dict
+from dataclasses import dataclass
+from typing import List, Dict, Tuple
+
+import numpy as np
 
 _ = load_dotenv(find_dotenv())
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
-embeddings = OpenAIEmbeddings(model='text-embedding-3-small',api_key=OPENAI_API_KEY)
+from pathlib import Path
+from embedding_cache import CachedEmbeddings
+from embedding_backends import EMBEDDING_BACKEND, get_embeddings
+
+# The persisted DB must have been built with the same backend (see rebuild_db.py)
+CHROMA_PERSIST_DIR = os.getenv("CHROMA_PERSIST_DIR", "./data/test_db")
+
+# Query embeddings are cached on disk, so repeated questions skip the embedding round trip
+EMBEDDING_CACHE_PATH = Path(os.getenv("EMBEDDING_CACHE_PATH", "./data/embedding_cache.db"))
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "100000"))
+
+base_embeddings, embedding_model_name = get_embeddings(EMBEDDING_BACKEND)
+
+embeddings = CachedEmbeddings(
+    base_embeddings,
+    cache_path=EMBEDDING_CACHE_PATH,
+    model_name=embedding_model_name,
+    max_entries=EMBEDDING_CACHE_SIZE
+)
 
 from langchain_chroma import Chroma
+from langchain_core.documents import Document
 
 docsearch = Chroma(
-    persist_directory="./data/test_db",
+    persist_directory=CHROMA_PERSIST_DIR,
     embedding_function=embeddings
 )
 
+from retrieval_cache import RetrievalCache
+
+# Tool results are memoized per normalized arguments and dropped whenever the DB directory changes
+RETRIEVAL_CACHE_PATH = os.getenv("RETRIEVAL_CACHE_PATH", "")
+retrieval_cache = RetrievalCache(
+    watch_dir=Path(CHROMA_PERSIST_DIR),
+    max_entries=int(os.getenv("RETRIEVAL_CACHE_SIZE", "1024")),
+    ttl=float(os.getenv("RETRIEVAL_CACHE_TTL", "3600")),
+    persist_path=Path(RETRIEVAL_CACHE_PATH) if RETRIEVAL_CACHE_PATH else None
+)
+
+import lexical_index
+
+# BM25 index over the same chunks, loaded from LEXICAL_INDEX_PATH or built on first hybrid search
+LEXICAL_INDEX_PATH = Path(os.getenv("LEXICAL_INDEX_PATH", "./data/lexical_index.pkl"))
+_lexical_index = None
+
+def get_lexical_index() -> lexical_index.BM25Index:
+    global _lexical_index
+    fingerprint = retrieval_cache.fingerprint
+    if _lexical_index is None or _lexical_index.fingerprint != fingerprint:
+        _lexical_index = lexical_index.load_or_build(docsearch._collection, LEXICAL_INDEX_PATH, fingerprint)
+    return _lexical_index
+
+import partition_index
+
+# Filtered searches over at most this many documents are scored exactly with NumPy instead of HNSW
+EXACT_SEARCH_MAX_DOCS = int(os.getenv("EXACT_SEARCH_MAX_DOCS", "2000"))
+_partition_index = None
+
+def get_partition_index() -> partition_index.PartitionIndex:
+    global _partition_index
+    fingerprint = retrieval_cache.fingerprint
+    if _partition_index is None or _partition_index.fingerprint != fingerprint:
+        _partition_index = partition_index.build_from_collection(docsearch._collection, fingerprint)
+    return _partition_index
+
+import table_store
+
+# Parsed numeric cells of every table chunk, built by table_store.py or on first lookup
+TABLE_STORE_PATH = Path(os.getenv("TABLE_STORE_PATH", "./data/table_cells.db"))
+_table_store_conn = None
+_table_store_fingerprint = None
+
+def get_table_store():
+    global _table_store_conn, _table_store_fingerprint
+    fingerprint = retrieval_cache.fingerprint
+    if _table_store_conn is None or _table_store_fingerprint != fingerprint:
+        if table_store.stored_fingerprint(TABLE_STORE_PATH) != fingerprint:
+            if _table_store_conn is not None:
+                _table_store_conn.close()
+                _table_store_conn = None
+            table_store.ingest(docsearch._collection, TABLE_STORE_PATH, fingerprint)
+        if _table_store_conn is None:
+            _table_store_conn = table_store.connect(TABLE_STORE_PATH)
+        _table_store_fingerprint = fingerprint
+    return _table_store_conn
+
 mcp = FastMCP("Chroma")
+# Times every tool below and adds the server_stats tool
+stats = instrument(mcp)
+# Hit/miss counters of the query-embedding and retrieval caches, reported through server_stats rather than as agent tools
+stats.add_extra('embedding_cache', embeddings.stats)
+stats.add_extra('retrieval_cache', retrieval_cache.stats)
 
 import re
 
@@ -28,61 +113,135 @@ def extract_year(text):
     match = re.search(r'\b(19|20)\d{2}\b', text)
     return int(match.group()) if match else None
 
-@mcp.tool()
-def table_retrieval(question: str, ticker: str, target_year: int, focus: str = "", window: int = 1) -> List[Dict[str, str]]:
+def build_query(question: str, focus: str = "") -> str:
+    return (
+        f"Please provide detailed {focus} information. "
+        f"Specifically, answer the following question: {question}. "
+        f"The focus should remain on {focus} throughout."
+    ) if focus else question
+
+def multi_year_search(full_query: str, ticker: str, years: List[int], k: int = 8, context_type: str = "") -> Dict[int, List[Tuple[Document, float]]]:
     """
-    Retrieve the single best table data for Operating Profit Margin or current ratio.
-    Only the table with score >= 1.02 and numerically closest to 1 is returned.
+    Search several fiscal years with one query embedding and one filtered search.
+
+    The query is embedded once. When the matching (company, fiscal, context_type) partitions
+    hold at most EXACT_SEARCH_MAX_DOCS documents, each year is scored by exact brute force
+    over the in-memory partition index. Otherwise a single search with `fiscal $in years`
+    is issued for k * len(years) hits, which are then regrouped by year and cut to the top
+    k per year. If that search was saturated and a year came back with fewer than k hits,
+    the year is searched again with the same vector, so every year still gets its exact top k.
+
+    Returns:
+        Dict[int, List[Tuple[Document, float]]]: (document, score) hits per year, in search order.
     """
-    years = [target_year + i for i in range(-window, window + 2)]
-    all_candidates = []
+    def make_filter(year_condition):
+        conditions = [{"company": {"$eq": ticker}}, year_condition]
+        if context_type:
+            conditions.append({"context_type": {"$eq": context_type}})
+        return {"$and": conditions}
+
+    query_vector = embeddings.embed_query(full_query)
+
+    index = get_partition_index()
+    rows_by_year = index.rows(ticker, years, context_type)
+    if sum(rows.size for rows in rows_by_year.values()) <= EXACT_SEARCH_MAX_DOCS:
+        return {
+            year: [
+                (Document(id=index.ids[position], page_content=index.texts[position], metadata=index.metadatas[position]), distance)
+                for position, distance in index.search(query_vector, rows, k)
+            ]
+            for year, rows in rows_by_year.items()
+        }
+
+    n_results = k * len(years)
+    hits = docsearch.similarity_search_by_vector_with_relevance_scores(
+        embedding=query_vector,
+        k=n_results,
+        filter=make_filter({"fiscal": {"$in": years}})
+    )
 
-    for year in years:
-        full_query = (
-            f"Please provide detailed {focus} information. "
-            f"Specifically, answer the following question: {question}. "
-            f"The focus should remain on {focus} throughout."
-        ) if focus else question
+    by_year = {year: [] for year in years}
+    for doc, score in hits:
+        year_hits = by_year.get(doc.metadata.get('fiscal'))
+        if year_hits is not None and len(year_hits) < k:
+            year_hits.append((doc, score))
+
+    if len(hits) >= n_results:
+        for year in years:
+            if len(by_year[year]) < k:
+                by_year[year] = docsearch.similarity_search_by_vector_with_relevance_scores(
+                    embedding=query_vector,
+                    k=k,
+                    filter=make_filter({"fiscal": {"$eq": year}})
+                )
+
+    return by_year
+
+@dataclass
+class TableCandidates:
+    """
+    Table hits across all searched years, held as parallel arrays for batch scoring.
 
-        # Retrieve tables with scores
-        results_with_scores = docsearch.similarity_search_with_score(
-            query=full_query,
-            k=8,
-            filter={
-                "$and": [
-                    {"company": {"$eq": ticker}},
-                    {"fiscal": {"$eq": year}},
-                    {"context_type": {"$eq": "table"}}
-                ]
+    docs[i] was retrieved for fiscal year years[i] with the raw score scores[i]; the threshold
+    applies to the raw score, while ordering and output use it rounded to 4 places.
+    """
+    docs: List[Document]
+    years: np.ndarray
+    scores: np.ndarray
+
+    @classmethod
+    def from_hits(cls, hits_by_year: Dict[int, List[Tuple[Document, float]]]) -> "TableCandidates":
+        docs, years, scores = [], [], []
+        for year, hits in hits_by_year.items():
+            for doc, score in hits:
+                docs.append(doc)
+                years.append(year)
+                scores.append(score)
+        return cls(docs, np.asarray(years, dtype=np.int64), np.asarray(scores, dtype=np.float64))
+
+    def select(self, threshold: float = 1.02, top_k: int = 1) -> np.ndarray:
+        """Indices of up to top_k candidates with score >= threshold, numerically closest to 1 first."""
+        if top_k < 1:
+            raise ValueError("top_k must be at least 1")
+        eligible = np.flatnonzero(self.scores >= threshold)
+        order = np.argsort(np.abs(np.round(self.scores[eligible], 4) - 1), kind='stable')
+        return eligible[order[:top_k]]
+
+    def to_records(self, indices: np.ndarray) -> List[Dict[str, str]]:
+        return [
+            {
+                'year': extract_year(self.docs[i].page_content) or int(self.years[i]),
+                'content': self.docs[i].page_content,
+                'score': round(float(self.scores[i]), 4),
+                'rank': rank,
+                'doc_type': 'table'
             }
-        )
+            for rank, i in enumerate(indices, start=1)
+        ]
 
-        for doc, score in results_with_scores:
-            if score >= 1.02:
-                extracted_year = extract_year(doc.page_content)
-                all_candidates.append({
-                    'year': extracted_year or year,
-                    'content': doc.page_content,
-                    'score': round(score, 4),
-                    'rank': None,  # we will assign final rank after filtering
-                    'doc_type': 'table'
-                })
-
-    # Select the table closest to score = 1
-    if not all_candidates:
-        return []  # no table meets the 1.02 threshold
-
-    selected_table = min(
-        all_candidates,
-        key=lambda x: abs(x['score'] - 1)
-    )
-    selected_table['rank'] = 1  # assign final rank as 1
+@mcp.tool()
+@retrieval_cache.cached
+def table_retrieval(question: str, ticker: str, target_year: int, focus: str = "", window: int = 1, top_k: int = 1) -> List[Dict[str, str]]:
+    """
+    Retrieve the best table data for Operating Profit Margin or current ratio.
+    Only tables with score >= 1.02 are considered, and the top_k numerically closest to 1 are returned (the single best by default).
+    """
+    # Checked before searching, so a bad top_k costs no embedding or vector search
+    if top_k < 1:
+        raise ValueError("top_k must be at least 1")
+    years = [target_year + i for i in range(-window, window + 2)]
+
+    # Retrieve tables with scores for every year in one batched search
+    hits_by_year = multi_year_search(build_query(question, focus), ticker, years, k=8, context_type="table")
 
-    return [selected_table]
+    candidates = TableCandidates.from_hits(hits_by_year)
+    # Empty if no table meets the 1.02 threshold
+    return candidates.to_records(candidates.select(threshold=1.02, top_k=top_k))
 
 
 
 @mcp.tool()
+@retrieval_cache.cached
 def broadened_year_retrieval(question: str, ticker: str, target_year: int, focus: str = "", window: int = 1) -> List[Dict[str, str]]:
     """
     Retrieve documents not only for the target year but also for surrounding years (±window).
@@ -93,27 +252,12 @@ def broadened_year_retrieval(question: str, ticker: str, target_year: int, focus
     years = [target_year + i for i in range(-window, window + 2)]
     all_results = []
 
-    for year in years:
-        full_query = (
-            f"Please provide detailed {focus} information. "
-            f"Specifically, answer the following question: {question}. "
-            f"The focus should remain on {focus} throughout."
-        ) if focus else question
-
-        # directly similarity_search_with_score
-        results_with_scores = docsearch.similarity_search_with_score(
-            query=full_query,
-            k=8,
-            filter={
-                "$and": [
-                    {"company": {"$eq": ticker}},
-                    {"fiscal": {"$eq": year}}
-                ]
-            }
-        )
+    # one query embedding and one filtered search shared by all years
+    hits_by_year = multi_year_search(build_query(question, focus), ticker, years, k=8)
 
+    for year in years:
         # allignment for higher scores
-        sorted_results = sorted(results_with_scores, key=lambda x: x[1], reverse=True)
+        sorted_results = sorted(hits_by_year[year], key=lambda x: x[1], reverse=True)
 
         for rank, (doc, score) in enumerate(sorted_results, start=1):
             extracted_year = extract_year(doc.page_content)
@@ -126,6 +270,93 @@ def broadened_year_retrieval(question: str, ticker: str, target_year: int, focus
 
     return all_results
 
+@mcp.tool()
+@retrieval_cache.cached
+def hybrid_retrieval(question: str, ticker: str, target_year: int, focus: str = "", window: int = 1, context_type: str = "", k: int = 8, alpha: float = 0.5) -> List[Dict[str, str]]:
+    """
+    Retrieve documents by fusing BM25 keyword scores with vector similarity, for the target year and surrounding years (±window).
+    Prefer this tool when the question hinges on exact terms such as line-item names, acronyms (e.g. HQLA) or years.
+
+    Args:
+        question: The original question.
+        ticker: Company ticker.
+        target_year: The main fiscal year of interest.
+        focus: Optional focus topic.
+        window: How many years before/after to include.
+        context_type: Optional document type filter, e.g. "table" or "text".
+        k: Number of documents to return.
+        alpha: Weight of the vector score in the fused score (1 - alpha goes to the keyword score).
+
+    Returns:
+        List[Dict[str, str]]: Retrieved documents with 'year', 'content', 'score', 'rank', 'vector_score', 'lexical_score', 'doc_type'.
+    """
+    years = [target_year + i for i in range(-window, window + 2)]
+    index = get_lexical_index()
+
+    # Vector side: distances, lower is closer
+    vector_hits = {}
+    for year_hits in multi_year_search(build_query(question, focus), ticker, years, k=k, context_type=context_type).values():
+        for doc, distance in year_hits:
+            vector_hits[doc.id] = (doc, distance)
+
+    # Lexical side: BM25 over the same company/year/context_type partitions
+    candidates = index.candidates(ticker, years, context_type)
+    lexical_positions = {}
+    lexical_hits = {}
+    for position, score in index.search(f"{question} {focus}", candidates, k=k * len(years)):
+        lexical_positions[index.ids[position]] = position
+        lexical_hits[index.ids[position]] = score
+
+    def min_max(values: Dict[str, float]) -> Dict[str, float]:
+        if not values:
+            return {}
+        low, high = min(values.values()), max(values.values())
+        return {key: (value - low) / (high - low) if high > low else 1.0 for key, value in values.items()}
+
+    vector_norm = min_max({doc_id: -distance for doc_id, (_, distance) in vector_hits.items()})
+    lexical_norm = min_max(lexical_hits)
+    fused = {
+        doc_id: alpha * vector_norm.get(doc_id, 0.0) + (1 - alpha) * lexical_norm.get(doc_id, 0.0)
+        for doc_id in set(vector_norm) | set(lexical_norm)
+    }
+
+    results = []
+    for rank, (doc_id, score) in enumerate(sorted(fused.items(), key=lambda x: x[1], reverse=True)[:k], start=1):
+        if doc_id in vector_hits:
+            doc = vector_hits[doc_id][0]
+            content, metadata = doc.page_content, doc.metadata
+        else:
+            position = lexical_positions[doc_id]
+            content, metadata = index.texts[position], index.metadatas[position]
+        results.append({
+            'year': extract_year(content) or metadata.get('fiscal'),
+            'content': content,
+            'score': round(score, 4),
+            'rank': rank,
+            'vector_score': round(vector_hits[doc_id][1], 4) if doc_id in vector_hits else None,
+            'lexical_score': round(lexical_hits[doc_id], 4) if doc_id in lexical_hits else None,
+            'doc_type': metadata.get('context_type')
+        })
+
+    return results
+
+@mcp.tool()
+def table_cell_lookup(ticker: str, year: int, line_item: str, limit: int = 5) -> List[Dict[str, str]]:
+    """
+    Look up exact numeric values from pre-parsed financial tables, e.g. total current assets or net sales of a company in a year.
+    Use this first for Operating Profit Margin and current ratio inputs; fall back to table_retrieval only when no cell is found.
+
+    Args:
+        ticker: Company ticker.
+        year: Fiscal year of the value (the table column year).
+        line_item: Row name of the value, e.g. "total current assets".
+        limit: Maximum number of cells to return.
+
+    Returns:
+        List[Dict[str, str]]: Matching cells with 'row_label', 'column_label', 'column_year', 'fiscal', 'value', 'unit', 'raw', 'doc_id'.
+    """
+    return table_store.lookup(get_table_store(), ticker.strip().upper(), year, line_item, limit)
+
 '''
 @mcp.tool()
 def table_retrieval(question: str, ticker: str, target_year: int, focus: str = "", window: int = 1) -> List[Dict[str, str]]:
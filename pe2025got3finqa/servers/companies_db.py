@@ -0,0 +1,109 @@
+# companies_db.py
+# Loads companies.csv into a typed `companies` table: numeric market cap, price, volume and P/E,
+# the first founding year as an integer and the headquarters split into city and state.
+# Run it with `python ./servers/companies_db.py` after changing companies.csv.
+import csv
+import os
+import re
+import sqlite3
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+SCALES = {'K': 1e3, 'M': 1e6, 'B': 1e9, 'T': 1e12}
+YEAR_PATTERN = re.compile(r'\b(1[5-9]|20)\d{2}\b')
+
+SCHEMA = """
+    CREATE TABLE companies (
+        "Symbol" TEXT PRIMARY KEY,
+        "Security" TEXT NOT NULL,
+        "Market cap" REAL,
+        "Price" REAL,
+        "Volume" INTEGER,
+        "Rel Volume" REAL,
+        "P/E" REAL,
+        "Sector" TEXT,
+        "Headquarters Location" TEXT,
+        "HQ City" TEXT,
+        "HQ State" TEXT,
+        "Founded" INTEGER,
+        "Founded Note" TEXT
+    );
+    CREATE INDEX idx_companies_sector ON companies("Sector");
+    CREATE INDEX idx_companies_founded ON companies("Founded");
+    CREATE INDEX idx_companies_pe ON companies("P/E");
+    CREATE INDEX idx_companies_market_cap ON companies("Market cap");
+"""
+
+
+def parse_amount(text: str) -> Optional[float]:
+    """'29.22 B USD' -> 29220000000.0, '1.77 M' -> 1770000.0, '1,234.50 USD' -> 1234.5, '—' -> None."""
+    match = re.match(r'\s*(-?[\d,]*\.?\d+)\s*([KMBT])?\b', text or "")
+    if not match:
+        return None
+    return float(match.group(1).replace(',', '')) * SCALES.get(match.group(2), 1)
+
+
+def parse_founded(text: str) -> Optional[int]:
+    """First year of the Founded field, e.g. '2013 (1888)' -> 2013."""
+    match = YEAR_PATTERN.search(text or "")
+    return int(match.group()) if match else None
+
+
+def parse_headquarters(text: str) -> Tuple[str, str]:
+    """('City', 'State or country') of the first listed headquarters, e.g. 'Columbus, Ohio; Detroit, Michigan'."""
+    parts = [part.strip() for part in (text or "").split(';')[0].split(',')]
+    return parts[0], parts[-1] if len(parts) > 1 else ""
+
+
+def parse_row(row: Dict[str, str]) -> Tuple[Any, ...]:
+    city, state = parse_headquarters(row['Headquarters Location'])
+    volume = parse_amount(row['Volume'])
+    return (
+        row['Symbol'].strip(),
+        row['Security'].strip(),
+        parse_amount(row['Market cap']),
+        parse_amount(row['Price']),
+        int(volume) if volume is not None else None,
+        parse_amount(row['Rel Volume']),
+        parse_amount(row['P/E']),
+        row['Sector'].strip(),
+        row['Headquarters Location'].strip(),
+        city,
+        state,
+        parse_founded(row['Founded']),
+        row['Founded'].strip()
+    )
+
+
+def ingest(csv_path: Path, db_path: Path) -> int:
+    """
+    Replace the `companies` table of db_path with the typed rows of csv_path.
+
+    Returns:
+        Number of companies written.
+    """
+    with open(csv_path, 'r', encoding='utf-8') as f:
+        rows = [parse_row(row) for row in csv.DictReader(f)]
+
+    conn = sqlite3.connect(str(db_path), isolation_level=None)
+    try:
+        # One explicit transaction around DDL and inserts, so readers never see a half-migrated table
+        with conn:
+            conn.execute("BEGIN")
+            conn.execute("DROP TABLE IF EXISTS companies")
+            for statement in SCHEMA.split(';'):
+                if statement.strip():
+                    conn.execute(statement)
+            conn.executemany(f"INSERT INTO companies VALUES ({', '.join('?' * 13)})", rows)
+        conn.execute("ANALYZE")
+        conn.execute("VACUUM")
+    finally:
+        conn.close()
+    return len(rows)
+
+
+if __name__ == "__main__":
+    csv_path = Path(os.getenv("COMPANIES_CSV_PATH", "./data/companies.csv"))
+    db_path = Path(os.getenv("COMPANIES_DB_PATH", "./data/companies.db"))
+    count = ingest(csv_path, db_path)
+    print(f"✅ Stored {count} companies into {db_path}")
@@ -0,0 +1,83 @@
+# embedding_backends.py
+import hashlib
+import os
+import re
+from typing import List, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+# Backend used by the Chroma server and the rebuild tool: "openai", "local" or "hash"
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "openai")
+OPENAI_EMBEDDING_MODEL = os.getenv("OPENAI_EMBEDDING_MODEL", "text-embedding-3-small")
+LOCAL_EMBEDDING_MODEL = os.getenv("LOCAL_EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+HASH_EMBEDDING_DIM = int(os.getenv("HASH_EMBEDDING_DIM", "1536"))
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+
+
+class HashingEmbeddings(Embeddings):
+    """
+    Deterministic feature-hashing embedder with no model and no network access.
+
+    Each token is hashed into one of `dim` buckets with a hash-derived sign, counts are
+    log-scaled and the vector is L2-normalized. Texts sharing tokens (years, tickers,
+    line items) end up close, which is enough for offline runs and benchmarks.
+    """
+
+    def __init__(self, dim: int = HASH_EMBEDDING_DIM, batch_size: int = EMBEDDING_BATCH_SIZE):
+        self.dim = dim
+        self.batch_size = batch_size
+
+    def _embed_batch(self, texts: List[str]) -> np.ndarray:
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for token in re.findall(r"\w+", text.lower()):
+                digest = hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest()
+                value = int.from_bytes(digest, "little")
+                matrix[row, value % self.dim] += 1.0 if (value >> 63) & 1 else -1.0
+        matrix = np.sign(matrix) * np.log1p(np.abs(matrix))
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors = []
+        for start in range(0, len(texts), self.batch_size):
+            vectors.extend(self._embed_batch(texts[start:start + self.batch_size]).tolist())
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed_batch([text])[0].tolist()
+
+
+def get_embeddings(backend: str = EMBEDDING_BACKEND) -> Tuple[Embeddings, str]:
+    """
+    Build the embedding backend selected by name.
+
+    Args:
+        backend: "openai" (OpenAI API), "local" (sentence-transformers model on CPU)
+            or "hash" (deterministic hashing embedder, mainly for tests and benchmarks)
+
+    Returns:
+        The embedder and a model name identifying its vector space.
+    """
+    if backend == "openai":
+        from langchain_openai import OpenAIEmbeddings
+        return OpenAIEmbeddings(model=OPENAI_EMBEDDING_MODEL, api_key=os.getenv("OPENAI_API_KEY")), OPENAI_EMBEDDING_MODEL
+
+    if backend == "local":
+        try:
+            from langchain_huggingface import HuggingFaceEmbeddings
+        except ImportError as e:
+            raise ImportError("The local embedding backend requires `langchain-huggingface` and `sentence-transformers`") from e
+        embedder = HuggingFaceEmbeddings(
+            model_name=LOCAL_EMBEDDING_MODEL,
+            model_kwargs={'device': 'cpu'},
+            encode_kwargs={'batch_size': EMBEDDING_BATCH_SIZE, 'normalize_embeddings': True}
+        )
+        return embedder, LOCAL_EMBEDDING_MODEL
+
+    if backend == "hash":
+        return HashingEmbeddings(), f"hash-{HASH_EMBEDDING_DIM}"
+
+    raise ValueError(f"Unknown embedding backend: {backend}")
@@ -0,0 +1,118 @@
+# embedding_cache.py
+import hashlib
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import List, Dict
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper with an on-disk, content-hash keyed cache in front of another embedder.
+
+    Vectors are stored in a SQLite file as float32 blobs, keyed by sha256(model + text).
+    Each hit refreshes the entry's last-used time, and once the cache grows past
+    max_entries the least recently used entries are evicted.
+    """
+
+    def __init__(self, underlying: Embeddings, cache_path: Path, model_name: str, max_entries: int = 100000):
+        self.underlying = underlying
+        self.cache_path = Path(cache_path)
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(self.cache_path), check_same_thread=False)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                key TEXT PRIMARY KEY,
+                vector BLOB NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings(last_used)")
+        self.conn.commit()
+
+    def _key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model_name}\0{text}".encode("utf-8")).hexdigest()
+
+    def _lookup(self, keys: List[str]) -> Dict[str, List[float]]:
+        found = {}
+        for key in keys:
+            row = self.conn.execute("SELECT vector FROM embeddings WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                found[key] = np.frombuffer(row[0], dtype=np.float32).tolist()
+        if found:
+            now = time.time()
+            self.conn.executemany("UPDATE embeddings SET last_used = ? WHERE key = ?", [(now, key) for key in found])
+        return found
+
+    def _store(self, items: Dict[str, List[float]]):
+        now = time.time()
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+            [(key, np.asarray(vector, dtype=np.float32).tobytes(), now) for key, vector in items.items()]
+        )
+        count = self.conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        if count > self.max_entries:
+            self.conn.execute(
+                "DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings ORDER BY last_used ASC LIMIT ?)",
+                (count - self.max_entries,)
+            )
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [self._key(text) for text in texts]
+        with self._lock:
+            found = self._lookup(list(dict.fromkeys(keys)))
+            missing = {key: text for key, text in zip(keys, texts) if key not in found}
+            n_missing = sum(1 for key in keys if key in missing)
+            self.hits += len(keys) - n_missing
+            self.misses += n_missing
+            self.conn.commit()
+
+        if missing:
+            # Embed outside the lock so a slow round trip does not block cache hits
+            vectors = self.underlying.embed_documents(list(missing.values()))
+            computed = dict(zip(missing.keys(), vectors))
+            with self._lock:
+                self._store(computed)
+                self.conn.commit()
+            found.update(computed)
+
+        return [found[key] for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        key = self._key(text)
+        with self._lock:
+            found = self._lookup([key])
+            self.conn.commit()
+        if key in found:
+            with self._lock:
+                self.hits += 1
+            return found[key]
+
+        vector = self.underlying.embed_query(text)
+        with self._lock:
+            self.misses += 1
+            self._store({key: vector})
+            self.conn.commit()
+        return vector
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            entries = self.conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            'entries': entries,
+            'max_entries': self.max_entries
+        }
@@ -0,0 +1,151 @@
+# expression.py
+# Safe evaluation of arithmetic formulas such as "(revenue_2007 - revenue_2006) / revenue_2006 * 100".
+# The formula is parsed with `ast` and only numbers, variables, arithmetic operators and whitelisted
+# functions are evaluated; nothing is ever passed to `eval`.
+import ast
+import math
+import operator
+import re
+from typing import Callable, Dict, Optional
+
+MAX_EXPRESSION_LENGTH = 1000
+MAX_EXPONENT = 100
+
+BINARY_OPERATORS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Mod: operator.mod,
+    ast.Pow: operator.pow
+}
+UNARY_OPERATORS = {
+    ast.UAdd: operator.pos,
+    ast.USub: operator.neg
+}
+CONSTANTS = {'pi': math.pi, 'e': math.e}
+
+# "12.5%" is a percentage unless an operand follows, then "%" stays the modulo operator ("10 % 3")
+# The lookbehind keeps the digits at the end of a name ("growth_2007%") from being read as a number
+PERCENT_PATTERN = re.compile(r'(?<![\w.])(\d+(?:\.\d+)?|\.\d+)\s*%(?!\s*[\w(.])')
+
+
+def _average(*values: float) -> float:
+    if not values:
+        raise ValueError("avg needs at least one value")
+    return sum(values) / len(values)
+
+
+def _round(value: float, ndigits: float = 0) -> float:
+    # Literals are evaluated as floats, but round() only accepts an integer number of digits
+    return round(value, int(ndigits))
+
+
+def _pct_change(new: float, old: float) -> float:
+    if old == 0:
+        raise ValueError("Old value cannot be zero.")
+    return (new - old) / old * 100
+
+
+BASE_FUNCTIONS: Dict[str, Callable] = {
+    'abs': abs,
+    'min': min,
+    'max': max,
+    'round': _round,
+    'sqrt': math.sqrt,
+    'log': math.log,
+    'exp': math.exp,
+    'sum': lambda *values: sum(values),
+    'avg': _average,
+    'pct_change': _pct_change
+}
+
+
+class Evaluator:
+    """Evaluates the parsed formula node by node against the given variables and functions."""
+
+    def __init__(self, variables: Dict[str, float], functions: Dict[str, Callable]):
+        self.variables = variables
+        self.functions = functions
+
+    def visit(self, node):
+        if isinstance(node, ast.Expression):
+            return self.visit(node.body)
+        if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)) and not isinstance(node.value, bool):
+            # Floats keep chained powers from growing unbounded integers
+            return float(node.value)
+        if isinstance(node, ast.Name):
+            if node.id in self.variables:
+                return self.variables[node.id]
+            if node.id in CONSTANTS:
+                return CONSTANTS[node.id]
+            raise ValueError(f"Unknown variable '{node.id}'")
+        if isinstance(node, ast.UnaryOp) and type(node.op) in UNARY_OPERATORS:
+            return UNARY_OPERATORS[type(node.op)](self.visit(node.operand))
+        if isinstance(node, ast.BinOp) and type(node.op) in BINARY_OPERATORS:
+            left, right = self.visit(node.left), self.visit(node.right)
+            if isinstance(node.op, ast.Pow) and abs(right) > MAX_EXPONENT:
+                raise ValueError(f"Exponent {right} is larger than {MAX_EXPONENT}")
+            if isinstance(node.op, (ast.Div, ast.FloorDiv, ast.Mod)) and right == 0:
+                raise ValueError("Cannot divide by zero")
+            result = BINARY_OPERATORS[type(node.op)](left, right)
+            # A negative base with a fractional exponent, e.g. (-8) ** 0.5
+            if isinstance(result, complex):
+                raise ValueError("Result is a complex number")
+            return result
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name):
+            if node.func.id not in self.functions:
+                raise ValueError(f"Unknown function '{node.func.id}'")
+            fn = self.functions[node.func.id]
+            args = [self.visit(arg) for arg in node.args]
+            kwargs = {keyword.arg: self.visit(keyword.value) for keyword in node.keywords if keyword.arg}
+            try:
+                return fn(*args, **kwargs)
+            except TypeError as e:
+                raise ValueError(f"Bad arguments for {node.func.id}: {e}")
+        raise ValueError(f"Unsupported syntax: {ast.dump(node)[:80]}")
+
+
+def evaluate(expression: str, variables: Optional[Dict[str, float]] = None,
+             functions: Optional[Dict[str, Callable]] = None) -> float:
+    """
+    Evaluate an arithmetic formula.
+
+    Args:
+        expression: Formula with numbers, + - * / // % **, parentheses, variable names and function calls.
+                    A number followed by "%" (e.g. "12.5%") is a percentage and evaluates to 0.125.
+        variables: Values for the variable names used in the formula
+        functions: Callable functions by name, BASE_FUNCTIONS when omitted
+
+    Returns:
+        Value of the formula
+
+    >>> evaluate("round(2.567, 2)")
+    2.57
+    >>> evaluate("(a - b) / b * 100 + 5%", {'a': 120, 'b': 100})
+    20.05
+    >>> evaluate("growth_2007% * 2", {'growth_2007': 12.5})
+    Traceback (most recent call last):
+    ValueError: Invalid expression: invalid syntax
+    >>> evaluate("(-8) ** 0.5")
+    Traceback (most recent call last):
+    ValueError: Result is a complex number
+    """
+    if len(expression) > MAX_EXPRESSION_LENGTH:
+        raise ValueError(f"Expression is longer than {MAX_EXPRESSION_LENGTH} characters")
+    expression = PERCENT_PATTERN.sub(r'(\1 / 100)', expression.replace('$', ''))
+    try:
+        tree = ast.parse(expression.strip(), mode='eval')
+    except SyntaxError as e:
+        raise ValueError(f"Invalid expression: {e.msg}")
+    try:
+        result = float(Evaluator(variables or {}, functions if functions is not None else BASE_FUNCTIONS).visit(tree))
+    except OverflowError:
+        raise ValueError("Result is too large")
+    # Float overflow (e.g. 9e999 or a long product) yields inf instead of raising
+    if math.isinf(result):
+        raise ValueError("Result is too large")
+    if math.isnan(result):
+        raise ValueError("Result is not a number")
+    return result
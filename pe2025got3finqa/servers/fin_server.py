@@ -1,11 +1,14 @@
 # fin_server.py
 from mcp.server.fastmcp import FastMCP
+from instrumentation import instrument
 from datetime import datetime
 import re
 from typing import Optional
 import numpy as np
 
 mcp = FastMCP("Fin")
+# Times every tool below and adds the server_stats tool
+stats = instrument(mcp)
 
 @mcp.tool()
 def calculate_eps(net_income: float, outstanding_shares: int) -> float:
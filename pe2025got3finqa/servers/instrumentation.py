@@ -0,0 +1,143 @@
+# instrumentation.py
+# Per-tool call counts, latency histograms, payload sizes and errors for the FastMCP servers.
+import functools
+import inspect
+import json
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Any, Callable, Dict
+
+# Upper bounds (ms) of the latency histogram buckets; the last bucket is open-ended
+LATENCY_BUCKETS_MS = (1, 5, 10, 50, 100, 500, 1000, 5000)
+# Latencies kept per tool for percentiles
+RECENT_LATENCIES = 1000
+
+
+def payload_size(value: Any) -> int:
+    try:
+        return len(json.dumps(value, default=str))
+    except (TypeError, ValueError):
+        return len(str(value))
+
+
+class ToolStats:
+    """Thread-safe counters for the tools of one server."""
+
+    def __init__(self, server_name: str):
+        self.server_name = server_name
+        self.started = time.time()
+        self._lock = threading.Lock()
+        # name -> callable whose result is reported under 'extras' of server_stats (e.g. cache counters)
+        self._extras: Dict[str, Callable[[], Any]] = {}
+        self._tools = defaultdict(lambda: {
+            'calls': 0,
+            'errors': 0,
+            'total_ms': 0.0,
+            'max_ms': 0.0,
+            'bytes_in': 0,
+            'bytes_out': 0,
+            'histogram': [0] * (len(LATENCY_BUCKETS_MS) + 1),
+            'recent': deque(maxlen=RECENT_LATENCIES),
+            'last_error': None
+        })
+
+    def record(self, tool: str, elapsed_ms: float, bytes_in: int, bytes_out: int, error: Exception = None):
+        bucket = next((i for i, bound in enumerate(LATENCY_BUCKETS_MS) if elapsed_ms <= bound), len(LATENCY_BUCKETS_MS))
+        with self._lock:
+            entry = self._tools[tool]
+            entry['calls'] += 1
+            entry['total_ms'] += elapsed_ms
+            entry['max_ms'] = max(entry['max_ms'], elapsed_ms)
+            entry['bytes_in'] += bytes_in
+            entry['bytes_out'] += bytes_out
+            entry['histogram'][bucket] += 1
+            entry['recent'].append(elapsed_ms)
+            if error is not None:
+                entry['errors'] += 1
+                entry['last_error'] = f"{type(error).__name__}: {error}"
+
+    def wrap(self, fn: Callable) -> Callable:
+        """Decorate a tool function so every call is timed and sized."""
+        name = fn.__name__
+
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    result = await fn(*args, **kwargs)
+                except Exception as e:
+                    self.record(name, (time.perf_counter() - start) * 1000, payload_size([args, kwargs]), 0, e)
+                    raise
+                self.record(name, (time.perf_counter() - start) * 1000, payload_size([args, kwargs]), payload_size(result))
+                return result
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                self.record(name, (time.perf_counter() - start) * 1000, payload_size([args, kwargs]), 0, e)
+                raise
+            self.record(name, (time.perf_counter() - start) * 1000, payload_size([args, kwargs]), payload_size(result))
+            return result
+        return wrapper
+
+    def add_extra(self, name: str, report: Callable[[], Any]):
+        """Include report() in every snapshot, for diagnostics that must not be agent-facing tools."""
+        self._extras[name] = report
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            tools = {}
+            for name, entry in self._tools.items():
+                recent = sorted(entry['recent'])
+                tools[name] = {
+                    'calls': entry['calls'],
+                    'errors': entry['errors'],
+                    'mean_ms': round(entry['total_ms'] / entry['calls'], 3) if entry['calls'] else 0.0,
+                    'p50_ms': round(recent[len(recent) // 2], 3) if recent else 0.0,
+                    'p95_ms': round(recent[min(len(recent) - 1, int(len(recent) * 0.95))], 3) if recent else 0.0,
+                    'max_ms': round(entry['max_ms'], 3),
+                    'total_ms': round(entry['total_ms'], 3),
+                    'bytes_in': entry['bytes_in'],
+                    'bytes_out': entry['bytes_out'],
+                    'histogram_ms': dict(zip([f"<={bound}" for bound in LATENCY_BUCKETS_MS] + [f">{LATENCY_BUCKETS_MS[-1]}"], entry['histogram'])),
+                    'last_error': entry['last_error']
+                }
+        # Reported outside the lock, the extras take their own locks
+        return {
+            'server': self.server_name,
+            'uptime_s': round(time.time() - self.started, 3),
+            'tools': tools,
+            'extras': {name: report() for name, report in self._extras.items()}
+        }
+
+
+def instrument(mcp) -> ToolStats:
+    """
+    Instrument every tool registered on mcp from now on and add a `server_stats` tool.
+
+    Call it right after creating the FastMCP instance, before any `@mcp.tool()`.
+    """
+    stats = ToolStats(mcp.name)
+    register_tool = mcp.tool
+
+    def tool(*args, **kwargs):
+        decorator = register_tool(*args, **kwargs)
+
+        def register(fn):
+            return decorator(stats.wrap(fn))
+        return register
+
+    mcp.tool = tool
+
+    @register_tool()
+    def server_stats() -> Dict[str, Any]:
+        """Report per-tool call counts, latency percentiles and histogram, payload sizes, errors and cache counters of this server."""
+        return stats.snapshot()
+
+    return stats
@@ -0,0 +1,134 @@
+# lexical_index.py
+# In-process BM25 inverted index over the FinQA chunks stored in the Chroma DB.
+# Prebuild it with `python ./servers/lexical_index.py`; otherwise the Chroma server builds it on first use.
+import math
+import os
+import pickle
+import re
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Thousands-grouped numbers, decimals, and words that keep inner "/", "&" or "-" (p/e, s&p, non-cash)
+TOKEN_PATTERN = re.compile(r"(?<!\d)\d{1,3}(?:,\d{3})+(?:\.\d+)?(?!\d)|\d+(?:\.\d+)?|[a-z]+(?:[/&-][a-z]+)*")
+
+STOPWORDS = {
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'in', 'is', 'it', 'of', 'on',
+    'or', 'that', 'the', 'this', 'to', 'was', 'were', 'what', 'which', 'with', 'how', 'much', 'many'
+}
+
+
+def tokenize(text: str) -> List[str]:
+    tokens = []
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        if token[0].isdigit():
+            tokens.append(token.replace(",", ""))
+        elif token not in STOPWORDS:
+            tokens.append(token)
+    return tokens
+
+
+class BM25Index:
+    """
+    Okapi BM25 over a fixed set of documents, with postings partitioned by metadata.
+
+    `partitions` maps (company, fiscal, context_type) to the positions of its documents,
+    so a search only scores the documents a retrieval filter would allow.
+    """
+
+    def __init__(self, ids: List[str], texts: List[str], metadatas: List[Dict], fingerprint: str = "", k1: float = 1.5, b: float = 0.75):
+        self.ids = ids
+        self.texts = texts
+        self.metadatas = metadatas
+        self.fingerprint = fingerprint
+        self.k1 = k1
+        self.b = b
+
+        self.postings: Dict[str, Dict[int, int]] = defaultdict(dict)
+        self.doc_lengths: List[int] = []
+        self.partitions: Dict[Tuple, List[int]] = defaultdict(list)
+        for position, (text, metadata) in enumerate(zip(texts, metadatas)):
+            counts = Counter(tokenize(text))
+            self.doc_lengths.append(sum(counts.values()))
+            for token, tf in counts.items():
+                self.postings[token][position] = tf
+            key = (metadata.get('company'), metadata.get('fiscal'), metadata.get('context_type'))
+            self.partitions[key].append(position)
+
+        self.postings = dict(self.postings)
+        self.partitions = dict(self.partitions)
+        self.avg_length = sum(self.doc_lengths) / len(self.doc_lengths) if self.doc_lengths else 0.0
+        n_docs = len(self.ids)
+        self.idf = {
+            token: math.log(1 + (n_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+            for token, docs in self.postings.items()
+        }
+
+    def candidates(self, company: str, years: Iterable[int], context_type: str = "") -> set:
+        """Positions of documents matching the company, any of the years and (optionally) the context type."""
+        years = set(years)
+        found = set()
+        for (doc_company, fiscal, doc_context_type), positions in self.partitions.items():
+            if doc_company == company and fiscal in years and (not context_type or doc_context_type == context_type):
+                found.update(positions)
+        return found
+
+    def search(self, query: str, candidates: Optional[set] = None, k: int = 8) -> List[Tuple[int, float]]:
+        """Return the top k (position, BM25 score) pairs, restricted to candidates when given."""
+        scores = defaultdict(float)
+        for token in set(tokenize(query)):
+            postings = self.postings.get(token)
+            if not postings:
+                continue
+            idf = self.idf[token]
+            if candidates is None:
+                matches = postings.items()
+            elif len(candidates) < len(postings):
+                matches = ((position, postings[position]) for position in candidates if position in postings)
+            else:
+                matches = ((position, tf) for position, tf in postings.items() if position in candidates)
+            for position, tf in matches:
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[position] / self.avg_length)
+                scores[position] += idf * tf * (self.k1 + 1) / (tf + norm)
+        return sorted(scores.items(), key=lambda x: x[1], reverse=True)[:k]
+
+    def save(self, path: Path):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'wb') as f:
+            pickle.dump(self, f)
+
+    @staticmethod
+    def load(path: Path) -> "BM25Index":
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+
+
+def build_from_collection(collection, fingerprint: str = "") -> BM25Index:
+    """Build the index from every document of a Chroma collection."""
+    data = collection.get(include=["documents", "metadatas"])
+    return BM25Index(data['ids'], data['documents'], data['metadatas'], fingerprint=fingerprint)
+
+
+def load_or_build(collection, index_path: Path, fingerprint: str) -> BM25Index:
+    """Load the prebuilt index if it matches the DB fingerprint, otherwise rebuild and save it."""
+    if Path(index_path).exists():
+        index = BM25Index.load(index_path)
+        if index.fingerprint == fingerprint:
+            return index
+    index = build_from_collection(collection, fingerprint=fingerprint)
+    index.save(index_path)
+    return index
+
+
+if __name__ == "__main__":
+    from langchain_chroma import Chroma
+    from retrieval_cache import directory_fingerprint
+    # Import through the module name so the pickle refers to lexical_index.BM25Index, not __main__
+    from lexical_index import build_from_collection
+
+    persist_dir = os.getenv("CHROMA_PERSIST_DIR", "./data/test_db")
+    index_path = Path(os.getenv("LEXICAL_INDEX_PATH", "./data/lexical_index.pkl"))
+    collection = Chroma(persist_directory=persist_dir)._collection
+    index = build_from_collection(collection, fingerprint=directory_fingerprint(Path(persist_dir)))
+    index.save(index_path)
+    print(f"✅ Indexed {len(index.ids)} documents ({len(index.postings)} terms) into {index_path}")
@@ -1,7 +1,14 @@
 # math_server.py
 from mcp.server.fastmcp import FastMCP
+from instrumentation import instrument
+from expression import BASE_FUNCTIONS, evaluate
+from typing import Dict, Optional
+import inspect
+import fin_server
 
 mcp = FastMCP("Math")
+# Times every tool below and adds the server_stats tool
+stats = instrument(mcp)
 
 @mcp.tool()
 def add(a: float, b: float) -> float:
@@ -40,5 +47,27 @@ def ratio(a: float, b: float) -> float:
         raise ValueError("Cannot divide by zero")
     return a / b
 
+# Every fin_server formula is callable by name inside an expression, e.g. "calculate_current_ratio(a, b) * 100"
+EXPRESSION_FUNCTIONS = {
+    **BASE_FUNCTIONS,
+    **{tool.name: inspect.unwrap(tool.fn) for tool in fin_server.mcp._tool_manager.list_tools() if tool.name != 'server_stats'}
+}
+
+@mcp.tool()
+def evaluate_expression(expression: str, variables: Optional[Dict[str, float]] = None) -> float:
+    """Evaluate a whole arithmetic formula in one call instead of chaining two-operand tools.
+
+    Args:
+        expression: Formula using numbers, variable names, + - * / ** and parentheses,
+                    e.g. "(revenue_2007 - revenue_2006) / revenue_2006 * 100". "12.5%" means 0.125.
+                    Callable functions: abs, min, max, round, sqrt, log, exp, sum, avg, pct_change(new, old)
+                    and every fin_server tool by name, e.g. calculate_operating_profit_margin(op, sales).
+        variables: Values of the variable names used in the expression, e.g. {"revenue_2007": 1410.5}
+
+    Returns:
+        Value of the formula
+    """
+    return evaluate(expression, variables, EXPRESSION_FUNCTIONS)
+
 if __name__ == "__main__":
     mcp.run(transport="stdio")
\ No newline at end of file
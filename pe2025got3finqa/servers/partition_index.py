@@ -0,0 +1,69 @@
+# partition_index.py
+# (company, fiscal, context_type) partitions of the Chroma DB with their embeddings held in a NumPy matrix,
+# so that small filtered searches are answered by exact brute force instead of filtered HNSW.
+from collections import defaultdict
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+
+
+class PartitionIndex:
+    """
+    Maps (company, fiscal, context_type) to the rows of an in-memory embedding matrix.
+
+    Distances follow the collection's HNSW space so scores stay comparable with Chroma's:
+    squared L2 for "l2", 1 - cosine similarity for "cosine" and 1 - inner product for "ip".
+    """
+
+    def __init__(self, ids: List[str], texts: List[str], metadatas: List[Dict], embeddings: np.ndarray, space: str = "l2", fingerprint: str = ""):
+        self.ids = ids
+        self.texts = texts
+        self.metadatas = metadatas
+        self.matrix = np.asarray(embeddings, dtype=np.float32)
+        self.space = space
+        self.fingerprint = fingerprint
+        self.norms_sq = np.einsum('ij,ij->i', self.matrix, self.matrix)
+
+        partitions = defaultdict(list)
+        for position, metadata in enumerate(metadatas):
+            partitions[(metadata.get('company'), metadata.get('fiscal'), metadata.get('context_type'))].append(position)
+        self.partitions = {key: np.asarray(positions, dtype=np.int64) for key, positions in partitions.items()}
+
+    def rows(self, company: str, years: Iterable[int], context_type: str = "") -> Dict[int, np.ndarray]:
+        """Row positions per year for the company and (optionally) the context type."""
+        by_year = {year: [] for year in years}
+        for (doc_company, fiscal, doc_context_type), positions in self.partitions.items():
+            if doc_company == company and fiscal in by_year and (not context_type or doc_context_type == context_type):
+                by_year[fiscal].append(positions)
+        return {
+            year: np.concatenate(parts) if parts else np.empty(0, dtype=np.int64)
+            for year, parts in by_year.items()
+        }
+
+    def distances(self, query_vector: List[float], rows: np.ndarray) -> np.ndarray:
+        query = np.asarray(query_vector, dtype=np.float32)
+        dots = self.matrix[rows] @ query
+        if self.space == "cosine":
+            return 1.0 - dots / (np.sqrt(self.norms_sq[rows]) * np.linalg.norm(query) + 1e-10)
+        if self.space == "ip":
+            return 1.0 - dots
+        return np.maximum(self.norms_sq[rows] + query @ query - 2.0 * dots, 0.0)
+
+    def search(self, query_vector: List[float], rows: np.ndarray, k: int) -> List[Tuple[int, float]]:
+        """Exact top k (position, distance) pairs among rows, closest first."""
+        if rows.size == 0:
+            return []
+        distances = self.distances(query_vector, rows)
+        if rows.size > k:
+            top = np.argpartition(distances, k - 1)[:k]
+        else:
+            top = np.arange(rows.size)
+        top = top[np.argsort(distances[top], kind='stable')]
+        return [(int(rows[i]), float(distances[i])) for i in top]
+
+
+def build_from_collection(collection, fingerprint: str = "") -> PartitionIndex:
+    """Load every document, its metadata and its embedding from a Chroma collection."""
+    data = collection.get(include=["documents", "metadatas", "embeddings"])
+    space = (collection.metadata or {}).get("hnsw:space", "l2")
+    return PartitionIndex(data['ids'], data['documents'], data['metadatas'], data['embeddings'], space=space, fingerprint=fingerprint)
@@ -0,0 +1,103 @@
+# query_cache.py
+# LRU cache of read-only SQL query results, invalidated when the database file is modified,
+# plus a bounded log of slow queries with their EXPLAIN QUERY PLAN.
+import copy
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+# Quoted string literals and identifiers, kept verbatim by normalize_sql
+QUOTED_PATTERN = re.compile(r"('(?:[^']|'')*'|\"(?:[^\"]|\"\")*\")")
+
+
+def normalize_sql(sql: str) -> str:
+    """Collapse whitespace outside quotes and drop a trailing semicolon, so formatting variants share a key."""
+    parts = QUOTED_PATTERN.split(sql.strip().rstrip(';'))
+    return "".join(part if i % 2 else re.sub(r'\s+', ' ', part) for i, part in enumerate(parts)).strip()
+
+
+class QueryCache:
+    """
+    Bounded LRU cache of query results for one SQLite file.
+
+    Every lookup compares the file's modification time with the one the cached results were
+    read at; when it changed, all entries are dropped and on_change is called (e.g. to reopen
+    immutable connections).
+    """
+
+    def __init__(self, db_path: Path, max_entries: int = 256, on_change: Optional[Callable[[], None]] = None,
+                 slow_log_size: int = 20):
+        self.db_path = Path(db_path)
+        self.max_entries = max_entries
+        self.on_change = on_change
+        self.memory = OrderedDict()
+        self.slow_queries = deque(maxlen=slow_log_size)
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._lock = threading.Lock()
+        self.mtime = self._current_mtime()
+
+    def _current_mtime(self) -> Optional[int]:
+        try:
+            return os.stat(self.db_path).st_mtime_ns
+        except OSError:
+            return None
+
+    def _check_mtime(self):
+        mtime = self._current_mtime()
+        if mtime != self.mtime:
+            self.mtime = mtime
+            self.memory.clear()
+            self.invalidations += 1
+            if self.on_change is not None:
+                self.on_change()
+
+    @staticmethod
+    def key(query: str, params: List[Any], *options) -> str:
+        return json.dumps([normalize_sql(query), params, options], default=str)
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            self._check_mtime()
+            if key in self.memory:
+                self.memory.move_to_end(key)
+                self.hits += 1
+                return copy.deepcopy(self.memory[key])
+            self.misses += 1
+            return None
+
+    def set(self, key: str, value: Any):
+        with self._lock:
+            self.memory[key] = copy.deepcopy(value)
+            self.memory.move_to_end(key)
+            while len(self.memory) > self.max_entries:
+                self.memory.popitem(last=False)
+
+    def record_slow(self, query: str, params: List[Any], elapsed_ms: float, plan: List[str]):
+        with self._lock:
+            self.slow_queries.append({
+                'query': normalize_sql(query),
+                'params': params,
+                'elapsed_ms': round(elapsed_ms, 3),
+                'plan': plan,
+                'at': time.time()
+            })
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'entries': len(self.memory),
+                'max_entries': self.max_entries,
+                'invalidations': self.invalidations,
+                'slow_queries': list(self.slow_queries)
+            }
@@ -5,35 +5,36 @@ import sqlite3
 import os
 from typing import List, Dict, Any, Optional
 from mcp.server.fastmcp import FastMCP
+from instrumentation import instrument
+from sqlite_pool import ReadOnlyPool
 from datetime import datetime
 import re
 # Initialize FastMCP server
 mcp = FastMCP("SQLite Explorer",
     log_level="CRITICAL")
+# Times every tool below and adds the server_stats tool
+stats = instrument(mcp)
 
 import sqlite3
 from pathlib import Path
 
 # Load company list from DB
 DB_PATH = Path('./data/companies.db')
+# Read-only connections reused by every extract_companies call
+pool = ReadOnlyPool(DB_PATH)
 
-def load_company_list_from_db(db_path: str, table_name: str = 'companies', column_name: str = 'Security') -> list:
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-
+def load_company_list_from_db(table_name: str = 'companies', column_name: str = 'Security') -> list:
     try:
-        cursor.execute(f"SELECT {column_name} FROM {table_name}")
-        companies = [row[0] for row in cursor.fetchall()]
+        with pool.connection() as conn:
+            companies = [row[0] for row in conn.execute(f"SELECT {column_name} FROM {table_name}")]
     except Exception as e:
         companies = []
         print(f"Error loading companies: {e}")
-    finally:
-        conn.close()
     
     return companies
 
 # Global company list loaded once
-company_list = load_company_list_from_db(str(DB_PATH))
+company_list = load_company_list_from_db()
 
 #def extract_companies(text: str) -> list:
 #    """
@@ -48,15 +49,16 @@ def extract_companies(text: str, level_rating: int) -> list:
         found = [c for c in company_list if c.lower() in text.lower()]
         return found
 
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+    # companies.db is typed (see companies_db.py): "Market cap" is REAL in USD, "P/E" REAL, Founded INTEGER
     conditions = []
+    params = []
     
     # P/E ratio
     pe_match = re.search(r'P/E ratio (between|from)\s*(\d+)\s*(and|to)\s*(\d+)', text, re.IGNORECASE)
     if pe_match:
         pe_low, pe_high = float(pe_match.group(2)), float(pe_match.group(4))
-        conditions.append(f'"P/E" BETWEEN {pe_low} AND {pe_high}')
+        conditions.append('"P/E" BETWEEN ? AND ?')
+        params += [pe_low, pe_high]
     
     # Market cap
     mc_match = re.search(r'market cap (exceeding|over|greater than)\s*(\d+)\s*(billion|million)?', text, re.IGNORECASE)
@@ -67,25 +69,30 @@ def extract_companies(text: str, level_rating: int) -> list:
             mc_value *= 1e9
         elif unit and 'million' in unit.lower():
             mc_value *= 1e6
-        conditions.append(f'"Market cap" > {mc_value}')
+        conditions.append('"Market cap" > ?')
+        params.append(mc_value)
     
     # Sector
     sector_match = re.search(r'(\w+ sector)', text, re.IGNORECASE)
     if sector_match:
-        sector = sector_match.group(1).capitalize()
-        conditions.append(f'Sector LIKE "%{sector}%"')
+        # "Technology sector" matches the sectors "Technology services" and "Electronic technology"
+        sector = sector_match.group(1)[:-len(' sector')]
+        conditions.append('Sector LIKE ?')
+        params.append(f"%{sector}%")
     
     # Founded year
-    founded_match = re.search(r'founded in (\d{4})s', text, re.IGNORECASE)
+    founded_match = re.search(r'founded in (?:the )?(\d{4})s', text, re.IGNORECASE)
     if founded_match:
         decade = int(founded_match.group(1))
-        conditions.append(f'Founded BETWEEN {decade} AND {decade + 9}')
+        conditions.append('Founded BETWEEN ? AND ?')
+        params += [decade, decade + 9]
 
     # Headquarters
     hq_match = re.search(r'headquartered in ([\w\s,]+)', text, re.IGNORECASE)
     if hq_match:
         location = hq_match.group(1).strip()
-        conditions.append(f'"Headquarters Location" LIKE "%{location}%"')
+        conditions.append('"Headquarters Location" LIKE ?')
+        params.append(f"%{location}%")
 
     if not conditions:
         print("No conditions parsed; fallback to empty result.")
@@ -95,13 +102,11 @@ def extract_companies(text: str, level_rating: int) -> list:
     query = f'SELECT Security FROM companies WHERE {where_clause}'
 
     try:
-        cursor.execute(query)
-        results = [row[0] for row in cursor.fetchall()]
+        with pool.connection() as conn:
+            results = [row[0] for row in conn.execute(query, params)]
     except sqlite3.Error as e:
         print(f"SQLite error: {e}")
         results = []
-    finally:
-        conn.close()
 
     return results
 
@@ -0,0 +1,60 @@
+# rebuild_db.py
+# Re-embed every document of a persisted Chroma DB with another embedding backend, e.g.
+#   EMBEDDING_BACKEND=local python ./servers/rebuild_db.py --target ./data/test_db_local
+# and then point the Chroma server at it with CHROMA_PERSIST_DIR=./data/test_db_local
+import argparse
+import time
+
+from dotenv import load_dotenv, find_dotenv
+
+_ = load_dotenv(find_dotenv())
+
+from langchain_chroma import Chroma
+from embedding_backends import EMBEDDING_BACKEND, get_embeddings
+
+
+def rebuild(source_dir: str, target_dir: str, backend: str, batch_size: int = 256) -> int:
+    """
+    Copy all documents, metadata and ids from source_dir into target_dir, embedding them with backend.
+
+    Returns:
+        Number of documents written.
+    """
+    source = Chroma(persist_directory=source_dir)
+    embedder, model_name = get_embeddings(backend)
+
+    collection_metadata = dict(source._collection.metadata or {})
+    collection_metadata['embedding_backend'] = backend
+    collection_metadata['embedding_model'] = model_name
+    target = Chroma(
+        persist_directory=target_dir,
+        embedding_function=embedder,
+        collection_metadata=collection_metadata
+    )
+
+    total = source._collection.count()
+    written = 0
+    start = time.perf_counter()
+    for offset in range(0, total, batch_size):
+        batch = source._collection.get(include=["documents", "metadatas"], limit=batch_size, offset=offset)
+        # add_texts embeds the whole batch with one embed_documents call
+        target.add_texts(texts=batch['documents'], metadatas=batch['metadatas'], ids=batch['ids'])
+        written += len(batch['ids'])
+        print(f"  {written}/{total} documents re-embedded ({time.perf_counter() - start:.1f}s)")
+
+    return written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-embed the Chroma DB with another embedding backend")
+    parser.add_argument("--source", default="./data/test_db", help="persisted Chroma DB to read documents from")
+    parser.add_argument("--target", required=True, help="directory for the rebuilt Chroma DB")
+    parser.add_argument("--backend", default=EMBEDDING_BACKEND, choices=["openai", "local", "hash"])
+    parser.add_argument("--batch-size", type=int, default=256)
+    args = parser.parse_args()
+
+    if args.source == args.target:
+        raise ValueError("Target directory must differ from the source directory")
+
+    count = rebuild(args.source, args.target, args.backend, args.batch_size)
+    print(f"✅ Rebuilt {count} documents into {args.target} with the '{args.backend}' backend")
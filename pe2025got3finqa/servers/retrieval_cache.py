@@ -0,0 +1,166 @@
+# retrieval_cache.py
+import copy
+import functools
+import hashlib
+import inspect
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+
+def normalize_text(text: str) -> str:
+    """Collapse runs of whitespace and strip the ends."""
+    return " ".join(text.split())
+
+
+def directory_fingerprint(directory: Path) -> str:
+    """Hash of the names, sizes and modification times of every file under directory."""
+    entries = []
+    for root, _, files in os.walk(directory):
+        for name in files:
+            stat = os.stat(os.path.join(root, name))
+            entries.append(f"{os.path.relpath(os.path.join(root, name), directory)}:{stat.st_size}:{stat.st_mtime_ns}")
+    return hashlib.sha256("\n".join(sorted(entries)).encode("utf-8")).hexdigest()
+
+
+class RetrievalCache:
+    """
+    Memoization for retrieval tools, with a bounded in-memory tier and an optional SQLite tier.
+
+    Entries expire after ttl seconds, the in-memory tier is LRU-evicted at max_entries, and
+    every entry is tagged with a fingerprint of watch_dir so that rebuilding the vector DB
+    invalidates all earlier results.
+    """
+
+    def __init__(self, watch_dir: Path, max_entries: int = 1024, ttl: float = 3600.0, persist_path: Optional[Path] = None):
+        self.watch_dir = Path(watch_dir)
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.memory = OrderedDict()
+        self.hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self.fingerprint = directory_fingerprint(self.watch_dir)
+
+        self.conn = None
+        if persist_path:
+            Path(persist_path).parent.mkdir(parents=True, exist_ok=True)
+            self.conn = sqlite3.connect(str(persist_path), check_same_thread=False)
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS results (
+                    key TEXT PRIMARY KEY,
+                    fingerprint TEXT NOT NULL,
+                    created REAL NOT NULL,
+                    value TEXT NOT NULL
+                )
+            """)
+            self.conn.execute("DELETE FROM results WHERE fingerprint != ?", (self.fingerprint,))
+            self.conn.commit()
+
+    def _check_fingerprint(self):
+        fingerprint = directory_fingerprint(self.watch_dir)
+        if fingerprint != self.fingerprint:
+            self.fingerprint = fingerprint
+            self.memory.clear()
+            if self.conn is not None:
+                self.conn.execute("DELETE FROM results WHERE fingerprint != ?", (fingerprint,))
+                self.conn.commit()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            self._check_fingerprint()
+            now = time.time()
+
+            entry = self.memory.get(key)
+            if entry is not None:
+                created, value = entry
+                if now - created <= self.ttl:
+                    self.memory.move_to_end(key)
+                    self.hits += 1
+                    return copy.deepcopy(value)
+                del self.memory[key]
+
+            if self.conn is not None:
+                row = self.conn.execute(
+                    "SELECT created, value FROM results WHERE key = ? AND fingerprint = ?",
+                    (key, self.fingerprint)
+                ).fetchone()
+                if row is not None and now - row[0] <= self.ttl:
+                    value = json.loads(row[1])
+                    self._remember(key, row[0], value)
+                    self.persistent_hits += 1
+                    return copy.deepcopy(value)
+
+            self.misses += 1
+            return None
+
+    def _remember(self, key: str, created: float, value: Any):
+        self.memory[key] = (created, value)
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_entries:
+            self.memory.popitem(last=False)
+
+    def set(self, key: str, value: Any):
+        with self._lock:
+            now = time.time()
+            self._remember(key, now, copy.deepcopy(value))
+            if self.conn is not None:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO results (key, fingerprint, created, value) VALUES (?, ?, ?, ?)",
+                    (key, self.fingerprint, now, json.dumps(value))
+                )
+                self.conn.commit()
+
+    def cached(self, fn: Callable) -> Callable:
+        """
+        Decorate a retrieval tool so repeated calls with equivalent arguments reuse its result.
+
+        String arguments are whitespace-normalized before the call, `ticker` is upper-cased and
+        `context_type` lower-cased, and the cache key is built from exactly these normalized values.
+        """
+        signature = inspect.signature(fn)
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            for name, value in bound.arguments.items():
+                if not isinstance(value, str):
+                    continue
+                if name == 'ticker':
+                    bound.arguments[name] = value.strip().upper()
+                elif name == 'context_type':
+                    bound.arguments[name] = value.strip().lower()
+                else:
+                    bound.arguments[name] = normalize_text(value)
+
+            # Key on the values fn actually receives, so arguments that fn treats differently never share an entry
+            key = hashlib.sha256(json.dumps([fn.__name__, bound.arguments], sort_keys=True).encode("utf-8")).hexdigest()
+
+            result = self.get(key)
+            if result is None:
+                result = fn(*bound.args, **bound.kwargs)
+                self.set(key, result)
+            return result
+
+        return wrapper
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.persistent_hits + self.misses
+            return {
+                'memory_hits': self.hits,
+                'persistent_hits': self.persistent_hits,
+                'misses': self.misses,
+                'hit_rate': round((self.hits + self.persistent_hits) / lookups, 4) if lookups else 0.0,
+                'memory_entries': len(self.memory),
+                'max_entries': self.max_entries,
+                'ttl': self.ttl,
+                'persistent': self.conn is not None
+            }
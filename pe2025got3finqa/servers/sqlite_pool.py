@@ -0,0 +1,86 @@
+# sqlite_pool.py
+# Shared read-only SQLite connections for the servers that query companies.db.
+# Connections are opened once with `mode=ro&immutable=1` (no locking, no change detection),
+# memory-mapped I/O and a prepared-statement cache, and are reused across tool calls.
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator
+
+POOL_SIZE = int(os.getenv("SQLITE_POOL_SIZE", "4"))
+MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(64 * 1024 * 1024)))
+STATEMENT_CACHE_SIZE = int(os.getenv("SQLITE_STATEMENT_CACHE_SIZE", "256"))
+
+
+class ReadOnlyPool:
+    """
+    A bounded pool of read-only connections to one SQLite file.
+
+    `immutable=1` tells SQLite the file never changes while it is open; call `reset()` after
+    the file was rewritten (e.g. by companies_db.py) so the next borrow opens fresh connections.
+    """
+
+    def __init__(self, db_path: Path, size: int = POOL_SIZE):
+        self.db_path = Path(db_path)
+        self.size = size
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._opened = 0
+        self._generation = 0
+
+    def _open(self) -> sqlite3.Connection:
+        if not self.db_path.exists():
+            raise FileNotFoundError(f"Database not found at: {self.db_path}")
+        uri = f"{self.db_path.resolve().as_uri()}?mode=ro&immutable=1"
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False, cached_statements=STATEMENT_CACHE_SIZE)
+        conn.row_factory = sqlite3.Row
+        conn.execute(f"PRAGMA mmap_size = {MMAP_SIZE}")
+        return conn
+
+    def _borrow(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._opened < self.size:
+                self._opened += 1
+                try:
+                    return self._open(), self._generation
+                except Exception:
+                    self._opened -= 1
+                    raise
+        # Every connection is in use; wait for one to come back
+        return self._idle.get()
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        conn, generation = self._borrow()
+        try:
+            yield conn
+        finally:
+            if generation == self._generation:
+                self._idle.put((conn, generation))
+            else:
+                # Replace a connection opened before reset(), which may still wake a waiting borrower
+                conn.close()
+                try:
+                    self._idle.put((self._open(), self._generation))
+                except Exception:
+                    with self._lock:
+                        self._opened -= 1
+
+    def reset(self):
+        """Close the idle connections; connections in use are closed when they are returned."""
+        with self._lock:
+            self._generation += 1
+            while True:
+                try:
+                    conn, _ = self._idle.get_nowait()
+                except queue.Empty:
+                    break
+                conn.close()
+                self._opened -= 1
@@ -3,37 +3,70 @@
 from pathlib import Path
 import sqlite3
 import os
-from typing import List, Dict, Any, Optional
+import time
+import json
+import base64
+import hashlib
+from typing import List, Dict, Any, Optional, Union
 from mcp.server.fastmcp import FastMCP
+from instrumentation import instrument
+from sqlite_pool import ReadOnlyPool
+from query_cache import QueryCache
 
 # Initialize FastMCP server
 mcp = FastMCP("SQLite Explorer",
     log_level="CRITICAL")
+# Times every tool below and adds the server_stats tool
+stats = instrument(mcp)
 
 # Path to Messages database
 DB_PATH = Path('./data/companies.db')
 
-class SQLiteConnection:
-    def __init__(self, db_path: Path):
-        self.db_path = db_path
-        self.conn = None
-        
-    def __enter__(self):
-        self.conn = sqlite3.connect(str(self.db_path))
-        self.conn.row_factory = sqlite3.Row
-        return self.conn
-        
-    def __exit__(self, exc_type, exc_val, exc_tb):
-        if self.conn:
-            self.conn.close()
+# Read-only connections shared by all tool calls instead of one connect() per call
+pool = ReadOnlyPool(DB_PATH)
+# Results of repeated queries; rewriting the DB file drops them and reopens the pooled connections
+query_cache = QueryCache(DB_PATH, max_entries=int(os.getenv("QUERY_CACHE_SIZE", "256")), on_change=pool.reset)
+# Queries slower than this are logged with their EXPLAIN QUERY PLAN
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "50"))
+# Cache counters and the slow-query log are reported through server_stats rather than as an agent tool
+stats.add_extra('query_cache', query_cache.stats)
+
+def explain(conn: sqlite3.Connection, query: str, params: List[Any]) -> List[str]:
+    return [row['detail'] for row in conn.execute(f"EXPLAIN QUERY PLAN {query}", params)]
+
+def quote_identifier(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+def encode_page_token(scope: str, offset: int) -> str:
+    payload = json.dumps({'scope': scope, 'offset': offset})
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+
+def decode_page_token(token: str, scope: str) -> int:
+    """Offset stored in a page token, which must come from the same query, params and projection."""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token.encode('ascii')))
+        if not isinstance(payload, dict):
+            raise ValueError("Invalid page token")
+        token_scope, offset = payload['scope'], int(payload['offset'])
+    except (ValueError, UnicodeError, KeyError, TypeError):
+        raise ValueError("Invalid page token")
+    if token_scope != scope:
+        raise ValueError("Page token belongs to a different query")
+    if offset < 0:
+        raise ValueError("Invalid page token")
+    return offset
 
 @mcp.tool()
 def read_query(
     query: str,
     params: Optional[List[Any]] = None,
     fetch_all: bool = True,
-    row_limit: int = 1000
-) -> List[Dict[str, Any]]:
+    row_limit: int = 1000,
+    columns: Optional[List[str]] = None,
+    page_size: Optional[int] = None,
+    page_token: Optional[str] = None,
+    columnar: bool = False
+) -> Union[List[Dict[str, Any]], Dict[str, Any]]:
     """Execute a query on the companies database. It contains information about the companies and their financial status.
     
     Args:
@@ -41,13 +74,29 @@ def read_query(
         params: Optional list of parameters for the query
         fetch_all: If True, fetches all results. If False, fetches one row.
         row_limit: Maximum number of rows to return (default 1000)
+        columns: Optional subset of the result columns to return
+        page_size: If set, return one page of at most page_size rows plus a next_page_token
+        page_token: next_page_token of the previous page, to fetch the following page of the same query
+        columnar: If True, return the compact shape even without paging
     
     Returns:
-        List of dictionaries containing the query results
+        List of dictionaries containing the query results, or with page_size/columnar the compact shape
+        {"columns": [names], "rows": [[values]], "next_page_token": token or null (paged only)}
     """
-    if not DB_PATH.exists():
-        raise FileNotFoundError(f"Messages database not found at: {DB_PATH}")
-    
+    params = params or []
+    paged = page_size is not None
+    if paged and page_size < 1:
+        raise ValueError("page_size must be at least 1")
+    # A cached query was validated when it was first executed
+    key = query_cache.key(query, params, fetch_all, row_limit, columns, page_size, page_token, columnar)
+    cached = query_cache.get(key)
+    if cached is not None:
+        return cached
+
+    # Page tokens are only valid for the query, params and projection that produced them
+    scope = hashlib.sha256(query_cache.key(query, params, row_limit, columns).encode('utf-8')).hexdigest()[:16]
+    offset = decode_page_token(page_token, scope) if page_token else 0
+
     # Clean and validate the query
     query = query.strip()
     
@@ -76,9 +125,7 @@ def read_query(
     if not any(query_lower.startswith(prefix) for prefix in ('select', 'with')):
         raise ValueError("Only SELECT queries (including WITH clauses) are allowed for safety")
     
-    params = params or []
-    
-    with SQLiteConnection(DB_PATH) as conn:
+    with pool.connection() as conn:
         cursor = conn.cursor()
         
         try:
@@ -86,18 +133,44 @@ def read_query(
             if 'limit' not in query_lower:
                 query = f"{query} LIMIT {row_limit}"
             
+            # Projection and paging wrap the query, so only the requested columns and rows leave SQLite
+            if columns or paged:
+                projection = ", ".join(quote_identifier(column) for column in columns) if columns else "*"
+                query = f"SELECT {projection} FROM ({query})"
+            if paged:
+                # One extra row tells whether another page follows
+                query = f"{query} LIMIT {int(page_size) + 1} OFFSET {offset}"
+            
+            start = time.perf_counter()
             cursor.execute(query, params)
             
-            if fetch_all:
-                results = cursor.fetchall()
-            else:
+            if not fetch_all:
                 results = [cursor.fetchone()]
+            elif paged:
+                results = cursor.fetchmany(page_size + 1)
+            else:
+                results = cursor.fetchall()
                 
-            return [dict(row) for row in results if row is not None]
+            rows = [row for row in results if row is not None]
+            if paged or columnar:
+                results = {
+                    'columns': [description[0] for description in cursor.description],
+                    'rows': [list(row) for row in rows[:page_size]]
+                }
+                if paged:
+                    results['next_page_token'] = encode_page_token(scope, offset + page_size) if len(rows) > page_size else None
+            else:
+                results = [dict(row) for row in rows]
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            if elapsed_ms >= SLOW_QUERY_MS:
+                query_cache.record_slow(query, params, elapsed_ms, explain(conn, query, params))
             
         except sqlite3.Error as e:
             raise ValueError(f"SQLite error: {str(e)}")
 
+    query_cache.set(key, results)
+    return results
+
 @mcp.tool()
 def list_tables() -> List[str]:
     """List all tables in the Messages database.
@@ -105,10 +178,7 @@ def list_tables() -> List[str]:
     Returns:
         List of table names in the database
     """
-    if not DB_PATH.exists():
-        raise FileNotFoundError(f"Messages database not found at: {DB_PATH}")
-    
-    with SQLiteConnection(DB_PATH) as conn:
+    with pool.connection() as conn:
         cursor = conn.cursor()
         
         try:
@@ -138,10 +208,7 @@ def describe_table(table_name: str) -> List[Dict[str, str]]:
         - dflt_value: Default value for the column
         - pk: Whether the column is part of the primary key
     """
-    if not DB_PATH.exists():
-        raise FileNotFoundError(f"Messages database not found at: {DB_PATH}")
-    
-    with SQLiteConnection(DB_PATH) as conn:
+    with pool.connection() as conn:
         cursor = conn.cursor()
         
         try:
@@ -163,5 +230,140 @@ def describe_table(table_name: str) -> List[Dict[str, str]]:
         except sqlite3.Error as e:
             raise ValueError(f"SQLite error: {str(e)}")
         
+# Numeric fields of the typed companies table (see companies_db.py) usable in screens, sorts and aggregates
+SCREEN_FIELDS = {
+    'market_cap': '"Market cap"',
+    'price': '"Price"',
+    'volume': '"Volume"',
+    'rel_volume': '"Rel Volume"',
+    'pe': '"P/E"',
+    'founded': '"Founded"'
+}
+AGGREGATE_FUNCTIONS = ('avg', 'min', 'max', 'sum', 'count')
+SCREEN_COLUMNS = ('Symbol', 'Security', 'Sector', 'Market cap', 'Price', 'P/E', 'Founded', 'HQ City', 'HQ State')
+
+def compile_aggregates(aggregates: List[str]) -> List[str]:
+    """["avg:pe", "count"] -> ['AVG("P/E") AS "avg_pe"', 'COUNT(*) AS "count"']"""
+    compiled = []
+    for spec in aggregates:
+        function, _, field = spec.strip().lower().partition(':')
+        if function not in AGGREGATE_FUNCTIONS:
+            raise ValueError(f"Unknown aggregate '{function}', use one of {', '.join(AGGREGATE_FUNCTIONS)}")
+        if function == 'count' and not field:
+            compiled.append('COUNT(*) AS "count"')
+            continue
+        if field not in SCREEN_FIELDS:
+            raise ValueError(f"Unknown field '{field}', use one of {', '.join(SCREEN_FIELDS)}")
+        compiled.append(f'{function.upper()}({SCREEN_FIELDS[field]}) AS "{function}_{field}"')
+    return compiled
+
+@mcp.tool()
+def screen_companies(
+    sector: Optional[str] = None,
+    founded_from: Optional[int] = None,
+    founded_to: Optional[int] = None,
+    pe_min: Optional[float] = None,
+    pe_max: Optional[float] = None,
+    market_cap_min: Optional[float] = None,
+    market_cap_max: Optional[float] = None,
+    price_min: Optional[float] = None,
+    price_max: Optional[float] = None,
+    hq_state: Optional[str] = None,
+    hq_city: Optional[str] = None,
+    sort_by: str = "market_cap",
+    descending: bool = True,
+    top_k: int = 10,
+    aggregates: Optional[List[str]] = None,
+    group_by_sector: bool = False
+) -> Dict[str, Any]:
+    """Screen the companies table with typed filters in a single call, instead of several read_query calls.
+
+    Args:
+        sector: Part of the sector name, e.g. "technology" matches "Technology services" and "Electronic technology"
+        founded_from / founded_to: Inclusive range of the founding year, e.g. 1990 and 1999 for the 1990s
+        pe_min / pe_max: Inclusive P/E ratio range
+        market_cap_min / market_cap_max: Inclusive market cap range in USD, e.g. 100e9 for 100 billion
+        price_min / price_max: Inclusive share price range in USD
+        hq_state / hq_city: Headquarters state (or country) and city, e.g. "California", "San Jose"
+        sort_by: One of market_cap, price, volume, rel_volume, pe, founded (or an aggregate name when grouping)
+        descending: Sort from largest to smallest (default True)
+        top_k: Number of companies (or sectors) to return
+        aggregates: Optional "function:field" list over all matching companies, e.g. ["count", "avg:pe", "max:market_cap"]
+        group_by_sector: If True, return the aggregates per sector instead of individual companies
+
+    Returns:
+        {"sql", "params", "companies": top_k matching companies, "aggregates": values over every match}
+        or, with group_by_sector, {"sql", "params", "groups": one entry per sector}
+    """
+    if top_k < 1:
+        raise ValueError("top_k must be at least 1")
+    conditions, params = [], []
+    for column, low, high in (
+        ('"Founded"', founded_from, founded_to),
+        ('"P/E"', pe_min, pe_max),
+        ('"Market cap"', market_cap_min, market_cap_max),
+        ('"Price"', price_min, price_max)
+    ):
+        if low is not None:
+            conditions.append(f"{column} >= ?")
+            params.append(low)
+        if high is not None:
+            conditions.append(f"{column} <= ?")
+            params.append(high)
+    if sector:
+        conditions.append('"Sector" LIKE ?')
+        params.append(f"%{sector.strip()}%")
+    if hq_state:
+        conditions.append('"HQ State" = ? COLLATE NOCASE')
+        params.append(hq_state.strip())
+    if hq_city:
+        conditions.append('"HQ City" = ? COLLATE NOCASE')
+        params.append(hq_city.strip())
+    where_clause = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+    compiled = compile_aggregates(aggregates or [])
+    direction = "DESC" if descending else "ASC"
+
+    if group_by_sector:
+        if not compiled:
+            compiled = compile_aggregates(["count"])
+        names = [aggregate.rsplit(' AS ', 1)[1].strip('"') for aggregate in compiled]
+        order = quote_identifier(sort_by) if sort_by in names else quote_identifier(names[0])
+        sql = (f'SELECT "Sector", {", ".join(compiled)} FROM companies{where_clause} '
+               f'GROUP BY "Sector" ORDER BY {order} {direction} LIMIT ?')
+    else:
+        if sort_by not in SCREEN_FIELDS:
+            raise ValueError(f"Unknown sort key '{sort_by}', use one of {', '.join(SCREEN_FIELDS)}")
+        order = SCREEN_FIELDS[sort_by]
+        # Aggregates are window functions over the whole match, so top-k and aggregates come back in one statement
+        windows = [aggregate.replace(' AS ', ' OVER () AS ', 1) for aggregate in compiled]
+        select_list = [quote_identifier(column) for column in SCREEN_COLUMNS] + windows
+        sql = (f'SELECT {", ".join(select_list)} FROM companies{where_clause} '
+               f'ORDER BY {order} IS NULL, {order} {direction} LIMIT ?')
+    params.append(top_k)
+
+    key = query_cache.key(sql, params)
+    cached = query_cache.get(key)
+    if cached is not None:
+        return cached
+
+    with pool.connection() as conn:
+        try:
+            rows = [dict(row) for row in conn.execute(sql, params)]
+        except sqlite3.Error as e:
+            raise ValueError(f"SQLite error: {str(e)}")
+
+    result = {'sql': sql, 'params': params}
+    if group_by_sector:
+        result['groups'] = rows
+    else:
+        aggregate_names = [window.rsplit(' AS ', 1)[1].strip('"') for window in windows]
+        result['aggregates'] = {
+            name: rows[0][name] if rows else (0 if name.startswith('count') else None)
+            for name in aggregate_names
+        }
+        result['companies'] = [{column: row[column] for column in SCREEN_COLUMNS} for row in rows]
+    query_cache.set(key, result)
+    return result
+
 if __name__ == "__main__":
     mcp.run(transport="stdio")
\ No newline at end of file
@@ -0,0 +1,181 @@
+# table_store.py
+# Columnar SQLite store of the numeric cells of every table chunk in the Chroma DB.
+# Build it with `python ./servers/table_store.py`; otherwise the Chroma server builds it on first use.
+import csv
+import os
+import re
+import sqlite3
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+YEAR_PATTERN = re.compile(r'\b(19|20)\d{2}\b')
+NUMBER_PATTERN = re.compile(r'-?\d+(?:\.\d+)?')
+SCALE_UNITS = ('thousands', 'millions', 'billions')
+# Bumped whenever parsing changes, so stores built by an older parser are rebuilt
+FORMAT_VERSION = 2
+
+
+def table_unit(header_label: str) -> str:
+    """Scale unit named in the header's first cell, e.g. '( dollars in millions )' -> 'millions'."""
+    label = header_label.lower()
+    for unit in SCALE_UNITS:
+        if unit in label:
+            return unit
+    return ""
+
+
+def parse_value(cell: str) -> Optional[float]:
+    """
+    Parse a FinQA table cell such as '$ 1410.5', '-453.1 ( 453.1 )' or '24.5% ( 24.5 % )'.
+
+    A bare '2014' is the FinQA rendering of an em dash (U+2014) and is treated as empty.
+    A cell rendered only in parentheses, the accounting negative '( 12.3 )', is -12.3.
+    """
+    cell = cell.strip()
+    if not cell or cell == '2014':
+        return None
+    # The parenthesised part repeats the magnitude, only the leading number carries the sign
+    leading, _, parenthesised = cell.partition('(')
+    match = NUMBER_PATTERN.search(leading.replace(',', '').replace('$', ''))
+    if match:
+        return float(match.group())
+    match = NUMBER_PATTERN.search(parenthesised.replace(',', '').replace('$', ''))
+    return -abs(float(match.group())) if match else None
+
+
+def parse_table(text: str) -> List[Dict[str, Any]]:
+    """Split a CSV-rendered table chunk into one record per numeric cell."""
+    rows = [row for row in csv.reader(text.strip().splitlines()) if row]
+    if len(rows) < 2:
+        return []
+
+    header = rows[0]
+    unit = table_unit(header[0])
+    column_years = []
+    for label in header:
+        match = YEAR_PATTERN.search(label)
+        column_years.append(int(match.group()) if match else None)
+
+    cells = []
+    for row in rows[1:]:
+        row_label = row[0].strip()
+        for column, raw in enumerate(row[1:], start=1):
+            value = parse_value(raw)
+            if value is None:
+                continue
+            cells.append({
+                'row_label': row_label,
+                'column_label': header[column].strip() if column < len(header) else "",
+                'column_year': column_years[column] if column < len(column_years) else None,
+                'value': value,
+                'unit': '%' if '%' in raw else unit,
+                'raw': raw.strip()
+            })
+    return cells
+
+
+def connect(db_path: Path) -> sqlite3.Connection:
+    conn = sqlite3.connect(str(db_path), check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def ingest(collection, db_path: Path, fingerprint: str = "") -> int:
+    """
+    Parse every `context_type == "table"` document of a Chroma collection into db_path.
+
+    Returns:
+        Number of cells written.
+    """
+    data = collection.get(where={"context_type": {"$eq": "table"}}, include=["documents", "metadatas"])
+
+    Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+    conn = connect(db_path)
+    try:
+        conn.executescript("""
+            DROP TABLE IF EXISTS cells;
+            DROP TABLE IF EXISTS meta;
+            CREATE TABLE cells (
+                doc_id TEXT NOT NULL,
+                company TEXT NOT NULL,
+                fiscal INTEGER,
+                row_label TEXT NOT NULL,
+                column_label TEXT,
+                column_year INTEGER,
+                value REAL NOT NULL,
+                unit TEXT,
+                raw TEXT
+            );
+            CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+        """)
+        count = 0
+        for doc_id, text, metadata in zip(data['ids'], data['documents'], data['metadatas']):
+            cells = parse_table(text)
+            conn.executemany(
+                "INSERT INTO cells VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (doc_id, metadata.get('company'), metadata.get('fiscal'), cell['row_label'], cell['column_label'],
+                     cell['column_year'], cell['value'], cell['unit'], cell['raw'])
+                    for cell in cells
+                ]
+            )
+            count += len(cells)
+        conn.executescript("""
+            CREATE INDEX idx_cells_company_year ON cells(company, column_year);
+            CREATE INDEX idx_cells_company_fiscal ON cells(company, fiscal);
+        """)
+        conn.executemany("INSERT INTO meta VALUES (?, ?)", [('fingerprint', fingerprint), ('version', str(FORMAT_VERSION))])
+        conn.commit()
+    finally:
+        conn.close()
+    return count
+
+
+def stored_fingerprint(db_path: Path) -> Optional[str]:
+    if not Path(db_path).exists():
+        return None
+    conn = connect(db_path)
+    try:
+        meta = {row['key']: row['value'] for row in conn.execute("SELECT key, value FROM meta")}
+        if meta.get('version') != str(FORMAT_VERSION):
+            return None
+        return meta.get('fingerprint')
+    except sqlite3.Error:
+        return None
+    finally:
+        conn.close()
+
+
+def lookup(conn: sqlite3.Connection, ticker: str, year: int, line_item: str, limit: int = 5) -> List[Dict[str, Any]]:
+    """
+    Find the cells for a line item of a company in a given year.
+
+    Every word of line_item must appear in the row label. Cells in a column headed by the
+    year come first, then cells of tables filed for that fiscal year; shorter (more exact)
+    row labels rank higher within each group.
+    """
+    words = re.findall(r'\w+', line_item.lower())
+    if not words:
+        raise ValueError("Line item cannot be empty")
+    conditions = " AND ".join("lower(row_label) LIKE ?" for _ in words)
+    params = [f"%{word}%" for word in words]
+
+    rows = conn.execute(f"""
+        SELECT row_label, column_label, column_year, fiscal, value, unit, raw, doc_id
+        FROM cells
+        WHERE company = ? AND (column_year = ? OR (column_year IS NULL AND fiscal = ?)) AND {conditions}
+        ORDER BY column_year IS NULL, lower(row_label) != ?, length(row_label), fiscal DESC
+        LIMIT ?
+    """, [ticker, year, year, *params, line_item.lower().strip(), limit]).fetchall()
+    return [dict(row) for row in rows]
+
+
+if __name__ == "__main__":
+    from langchain_chroma import Chroma
+    from retrieval_cache import directory_fingerprint
+
+    persist_dir = os.getenv("CHROMA_PERSIST_DIR", "./data/test_db")
+    db_path = Path(os.getenv("TABLE_STORE_PATH", "./data/table_cells.db"))
+    collection = Chroma(persist_directory=persist_dir)._collection
+    count = ingest(collection, db_path, fingerprint=directory_fingerprint(Path(persist_dir)))
+    print(f"✅ Stored {count} table cells into {db_path}")
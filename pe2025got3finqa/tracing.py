@@ -0,0 +1,134 @@
+# tracing.py
+# Structured per-question traces of agent trajectories: every LLM call and tool call with its timing.
+import json
+import time
+from collections import defaultdict
+from typing import Any, Dict, List
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+
+class TraceRecorder(BaseCallbackHandler):
+    """
+    LangChain callback handler that records the ReAct steps of one question.
+
+    Each step is a dict with 'type' ('llm' or 'tool'), 'name', 'start_ms' (relative to the
+    question start), 'duration_ms', 'error' and, for LLM calls, token counts or, for tool
+    calls, the argument and result payload sizes in bytes.
+    """
+
+    # Run in the event loop instead of a thread pool, so timestamps are not skewed by executor hops
+    run_inline = True
+
+    def __init__(self, index: int, question: str):
+        self.index = index
+        self.question = question
+        self.started = time.perf_counter()
+        self.wall_start = time.time()
+        self.finished = None
+        self.steps: List[Dict[str, Any]] = []
+        self._open: Dict[Any, Dict[str, Any]] = {}
+
+    def _now_ms(self) -> float:
+        return (time.perf_counter() - self.started) * 1000
+
+    def _begin(self, run_id, step: Dict[str, Any]):
+        step['start_ms'] = round(self._now_ms(), 3)
+        self._open[run_id] = step
+
+    def _end(self, run_id, **fields):
+        step = self._open.pop(run_id, None)
+        if step is None:
+            return
+        step['duration_ms'] = round(self._now_ms() - step['start_ms'], 3)
+        step.update(fields)
+        self.steps.append(step)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        name = (kwargs.get('metadata') or {}).get('ls_model_name') or (serialized or {}).get('name', 'llm')
+        self._begin(run_id, {'type': 'llm', 'name': name})
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        usage = (response.llm_output or {}).get('token_usage') or {}
+        if not usage and response.generations and response.generations[0]:
+            message = getattr(response.generations[0][0], 'message', None)
+            metadata = getattr(message, 'usage_metadata', None) or {}
+            usage = {'prompt_tokens': metadata.get('input_tokens'), 'completion_tokens': metadata.get('output_tokens')}
+        self._end(run_id, input_tokens=usage.get('prompt_tokens'), output_tokens=usage.get('completion_tokens'))
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error=f"{type(error).__name__}: {error}")
+
+    def on_tool_start(self, serialized, input_str, *, run_id, **kwargs):
+        self._begin(run_id, {'type': 'tool', 'name': (serialized or {}).get('name', 'tool'), 'bytes_in': len(input_str or "")})
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        content = getattr(output, 'content', output)
+        self._end(run_id, bytes_out=len(content if isinstance(content, str) else json.dumps(content, default=str)))
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error=f"{type(error).__name__}: {error}")
+
+    def finish(self):
+        self.finished = self._now_ms()
+
+    def to_record(self) -> Dict[str, Any]:
+        llm_steps = [step for step in self.steps if step['type'] == 'llm']
+        return {
+            'index': self.index,
+            'Question': self.question,
+            'duration_ms': round(self.finished if self.finished is not None else self._now_ms(), 3),
+            'llm_calls': len(llm_steps),
+            'tool_calls': len(self.steps) - len(llm_steps),
+            'input_tokens': sum(step.get('input_tokens') or 0 for step in llm_steps),
+            'output_tokens': sum(step.get('output_tokens') or 0 for step in llm_steps),
+            'steps': sorted(self.steps, key=lambda step: step['start_ms'])
+        }
+
+
+def write_traces(recorders: List[TraceRecorder], jsonl_path: str, chrome_trace_path: str):
+    """Write one JSON line per question, plus a Chrome trace (chrome://tracing, Perfetto) with one row per question."""
+    with open(jsonl_path, 'w', encoding='utf-8') as f:
+        for recorder in recorders:
+            f.write(json.dumps(recorder.to_record()) + "\n")
+
+    run_start = min((recorder.wall_start for recorder in recorders), default=0.0)
+    events = []
+    for recorder in recorders:
+        offset_us = (recorder.wall_start - run_start) * 1e6
+        record = recorder.to_record()
+        events.append({'name': 'thread_name', 'ph': 'M', 'pid': 1, 'tid': recorder.index,
+                       'args': {'name': f"Q{recorder.index}: {recorder.question[:60]}"}})
+        events.append({'name': f"question {recorder.index}", 'cat': 'question', 'ph': 'X', 'pid': 1, 'tid': recorder.index,
+                       'ts': offset_us, 'dur': record['duration_ms'] * 1000})
+        for step in record['steps']:
+            events.append({
+                'name': step['name'], 'cat': step['type'], 'ph': 'X', 'pid': 1, 'tid': recorder.index,
+                'ts': offset_us + step['start_ms'] * 1000, 'dur': step['duration_ms'] * 1000,
+                'args': {key: value for key, value in step.items() if key not in ('name', 'type', 'start_ms', 'duration_ms')}
+            })
+    with open(chrome_trace_path, 'w', encoding='utf-8') as f:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+
+
+def print_trace_summary(recorders: List[TraceRecorder], top: int = 5):
+    records = [recorder.to_record() for recorder in recorders]
+
+    print(f"\nSlowest Questions (top {top}):")
+    for record in sorted(records, key=lambda r: r['duration_ms'], reverse=True)[:top]:
+        print(f"  Q{record['index']}: {record['duration_ms'] / 1000:.2f}s, {record['llm_calls']} LLM call(s), "
+              f"{record['tool_calls']} tool call(s), {record['input_tokens']}+{record['output_tokens']} tokens "
+              f"→ '{record['Question'][:50]}...'")
+
+    totals = defaultdict(lambda: {'calls': 0, 'total_ms': 0.0, 'bytes_out': 0})
+    for record in records:
+        for step in record['steps']:
+            key = f"{step['type']}:{step['name']}"
+            totals[key]['calls'] += 1
+            totals[key]['total_ms'] += step['duration_ms']
+            totals[key]['bytes_out'] += step.get('bytes_out') or 0
+
+    print(f"\nMost Expensive Steps (top {top} by total time):")
+    for key, entry in sorted(totals.items(), key=lambda item: item[1]['total_ms'], reverse=True)[:top]:
+        print(f"  {key}: {entry['calls']} call(s), total {entry['total_ms'] / 1000:.2f}s, "
+              f"mean {entry['total_ms'] / entry['calls']:.1f}ms, {entry['bytes_out']}B returned")